@@ -1,15 +1,23 @@
+import os
+import tempfile
 from flask import Flask
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_mail import Mail
+from flask_caching import Cache
+from celery import Celery
+from app.utils import ratelimit  # registers the batched-redis:// limiter storage
 
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
 limiter = Limiter(key_func=get_remote_address)
 mail = Mail()
+cache = Cache()
+celery = Celery(__name__, include=['app.tasks'])
 
 def create_app(config_class='config.DevelopmentConfig'):
     app = Flask(__name__)
@@ -17,11 +25,21 @@ def create_app(config_class='config.DevelopmentConfig'):
     # Load configuration
     app.config.from_object(config_class)
     
+    # orjson for every jsonify() / request.get_json() call
+    from app.utils.helpers import ORJSONProvider
+    app.json = ORJSONProvider(app)
+    
     # Initialize extensions with app
     db.init_app(app)
     login_manager.init_app(app)
     limiter.init_app(app)
     mail.init_app(app)
+    cache.init_app(app)
+    init_celery(app)
+    
+    if app.config.get('RATELIMIT_STORAGE_URI', '').startswith('memory://') and not (app.debug or app.testing):
+        # Each gunicorn worker would enforce its own copy of every limit
+        app.logger.warning('Rate limits use in-memory storage; set REDIS_URL to share them across workers')
     
     # Configure login manager
     login_manager.login_view = 'main.login'
@@ -32,15 +50,68 @@ def create_app(config_class='config.DevelopmentConfig'):
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
     
-    # Create database tables
-    with app.app_context():
-        if app.config.get('DEBUG'):
-            try:
-                db.drop_all()
-            except Exception as e:
-                print(f"Note during table cleanup: {e}")
-        
-        db.create_all()
-        print("Database setup complete!")
-    
-    return app
\ No newline at end of file
+    # Audit entries logged during a request are inserted together once the view returns
+    # (one INSERT + commit on the request's session, before the response goes out)
+    from app.models.audit import flush_audit_buffer
+    app.after_request(flush_audit_buffer)
+    
+    # Load balancer / k8s probes on /health never enter Flask (no session, login or limiter work)
+    app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {'/health': health_app})
+    
+    # Register CLI commands (flask init-db, create-admin, seed-data)
+    from app.cli.commands import register_commands
+    register_commands(app)
+    
+    # Schema management lives in `flask db upgrade` / `flask init-db`; workers do no
+    # schema work at startup unless explicitly opted in for local development
+    if os.environ.get('FLASK_AUTOCREATE') == '1':
+        autocreate_db(app)
+    
+    return app
+
+def init_celery(app):
+    """Point Celery at the configured broker and run every task inside an app context"""
+    celery.conf.update(
+        broker_url=app.config.get('CELERY_BROKER_URL'),
+        task_ignore_result=True
+    )
+    if app.config.get('STRIPE_WEBHOOK_QUEUE'):
+        celery.conf.task_routes = {
+            'app.tasks.handle_stripe_event_task': {'queue': app.config['STRIPE_WEBHOOK_QUEUE']}
+        }
+    
+    class FlaskTask(celery.Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+    
+    celery.Task = FlaskTask
+
+HEALTH_BODY = b'{"status":"healthy"}'
+
+def health_app(environ, start_response):
+    """Bare WSGI liveness endpoint mounted at /health"""
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', str(len(HEALTH_BODY)))])
+    return [HEALTH_BODY]
+
+def autocreate_db(app):
+    """Create missing tables, serialized across workers by a file lock"""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock on Windows - dev servers there run a single process anyway
+        with app.app_context():
+            db.create_all()
+        return
+    
+    lock_path = os.path.join(tempfile.gettempdir(), 'flask-saas-autocreate.lock')
+    with open(lock_path, 'w') as lock_file:
+        # Blocking: other workers wait for the schema instead of serving requests before it
+        # exists, then find every table present (create_all only adds missing ones)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with app.app_context():
+                db.create_all()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
\ No newline at end of file
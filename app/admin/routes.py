@@ -4,6 +4,7 @@ from app import db
 from app.models.user import User, UserRole
 from app.models.organization import Organization
 from app.utils.decorators import role_required
+from app.utils.stats import get_user_stats, get_organization_count
 from sqlalchemy import func
 
 bp = Blueprint('admin', __name__)
@@ -13,10 +14,10 @@ bp = Blueprint('admin', __name__)
 @role_required('admin')
 def index():
     """Admin dashboard"""
-    # System-wide statistics
-    total_users = User.query.count()
-    total_orgs = Organization.query.count()
-    verified_users = User.query.filter_by(is_verified=True).count()
+    # System-wide statistics, from the same cached aggregates as the main admin dashboard
+    user_stats = get_user_stats()
+    total_users, verified_users = user_stats['total_users'], user_stats['verified_users']
+    total_orgs = get_organization_count()
     
     # Recent activity
     recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
@@ -46,14 +47,8 @@ def users():
     query = User.query
     
     if search:
-        query = query.filter(
-            db.or_(
-                User.username.contains(search),
-                User.email.contains(search),
-                User.first_name.contains(search),
-                User.last_name.contains(search)
-            )
-        )
+        clause, pattern = User.search_clause(search)
+        query = query.filter(clause).params(q=pattern)
     
     if role_filter:
         query = query.filter_by(role=UserRole(role_filter))
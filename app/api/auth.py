@@ -1,13 +1,20 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from app import db, limiter
-from app.models.user import User
+from app.models.user import User, check_dummy_password
+from app.utils.decorators import load_actor
+from app.utils.helpers import json_response
+from app.utils.jwt_cache import jwt_required_with_claims, get_cached_user
 from datetime import timedelta
 
 bp = Blueprint('api', __name__)
 jwt = JWTManager()
 
+def _access_claims(organization_id, role, is_active):
+    """Authorization claims for access tokens only, so API requests can skip loading the user"""
+    return {'org_id': organization_id, 'role': role.value, 'active': is_active}
+
 @bp.route('/auth/login', methods=['POST'])
 @limiter.limit("10 per minute")
 def api_login():
@@ -16,13 +23,19 @@ def api_login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Email and password required'}), 400
     
-    user = User.query.filter_by(email=data['email'].lower()).first()
+    user = User.find_by_email(data['email'])
     
-    if user and user.check_password(data['password']) and user.is_active:
+    if user is None:
+        check_dummy_password(data['password'])
+    elif user.check_password(data['password']) and user.is_active:
+        user.rehash_password(data['password'])
+        
         access_token = create_access_token(
             identity=user.id,
-            expires_delta=timedelta(hours=1)
+            expires_delta=timedelta(hours=1),
+            additional_claims=_access_claims(user.organization_id, user.role, user.is_active)
         )
+        # No authorization claims: they would outlive role and status changes for 30 days
         refresh_token = create_refresh_token(
             identity=user.id,
             expires_delta=timedelta(days=30)
@@ -39,20 +52,25 @@ def api_login():
 @bp.route('/auth/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def api_refresh():
-    current_user_id = get_jwt_identity()
+    # Claims come from the current row (one read per access token), so deactivation,
+    # demotion or an org move takes effect within the access token's hour
+    actor = load_actor(get_jwt_identity())
+    if actor is None or not actor.is_active:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    
     access_token = create_access_token(
-        identity=current_user_id,
-        expires_delta=timedelta(hours=1)
+        identity=actor.id,
+        expires_delta=timedelta(hours=1),
+        additional_claims=_access_claims(actor.organization_id, actor.role, actor.is_active)
     )
     return jsonify({'access_token': access_token})
 
 @bp.route('/auth/me', methods=['GET'])
-@jwt_required()
+@jwt_required_with_claims
 def api_me():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_cached_user(g.jwt_identity, g.jwt_claims['jti'])
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify({'user': user.to_dict()})
+    return json_response({'user': user})
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify
 from flask_login import login_required
+from app import limiter
 
 bp = Blueprint('api', __name__)
 
 @bp.route('/health')
+@limiter.exempt
 def health_check():
     return jsonify({'status': 'healthy'})
\ No newline at end of file
@@ -1,42 +1,38 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_login import login_required, current_user
 from app import db, limiter
 from app.models.user import User, UserRole
-from app.utils.decorators import role_required
+from app.utils.decorators import role_required, current_actor
+from app.utils.helpers import json_response
+from app.utils.jwt_cache import jwt_required_with_claims, invalidate_user
+from app.utils.stats import invalidate_user_stats
 
 bp = Blueprint('api_users', __name__)
 
 @bp.route('/users', methods=['GET'])
-@jwt_required()
+@jwt_required_with_claims
 @limiter.limit("100 per minute")
 def get_users():
     """Get users for current organization"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    actor = current_actor()
     
-    if not user or not user.organization_id:
+    if not actor or not actor.organization_id:
         return jsonify({'error': 'Organization required'}), 400
     
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 25, type=int), 100)
     search = request.args.get('search', '')
     
-    query = User.query.filter_by(organization_id=user.organization_id)
+    query = User.query.filter_by(organization_id=actor.organization_id)
     
     if search:
-        query = query.filter(
-            db.or_(
-                User.username.contains(search),
-                User.email.contains(search),
-                User.first_name.contains(search),
-                User.last_name.contains(search)
-            )
-        )
+        clause, pattern = User.search_clause(search)
+        query = query.filter(clause).params(q=pattern)
     
     users = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    return jsonify({
+    return json_response({
         'users': [user.to_dict() for user in users.items],
         'pagination': {
             'page': users.page,
@@ -49,35 +45,38 @@ def get_users():
     })
 
 @bp.route('/users/<int:user_id>', methods=['GET'])
-@jwt_required()
+@jwt_required_with_claims
 def get_user(user_id):
     """Get specific user"""
-    current_user_id = get_jwt_identity()
-    current_user_obj = User.query.get(current_user_id)
+    actor = current_actor()
+    if not actor:
+        return jsonify({'error': 'User not found'}), 404
     
     user = User.query.get_or_404(user_id)
     
     # Check if user belongs to same organization
-    if user.organization_id != current_user_obj.organization_id:
+    if user.organization_id != actor.organization_id:
         return jsonify({'error': 'Access denied'}), 403
     
-    return jsonify({'user': user.to_dict()})
+    return json_response({'user': user.to_dict()})
 
 @bp.route('/users/<int:user_id>', methods=['PUT'])
-@jwt_required()
+@jwt_required_with_claims
 @limiter.limit("30 per minute")
 def update_user(user_id):
     """Update user"""
-    current_user_id = get_jwt_identity()
-    current_user_obj = User.query.get(current_user_id)
+    current_user_id = g.jwt_identity
+    actor = current_actor()
+    if not actor:
+        return jsonify({'error': 'User not found'}), 404
     
     user = User.query.get_or_404(user_id)
     
     # Check permissions
-    if user.organization_id != current_user_obj.organization_id:
+    if user.organization_id != actor.organization_id:
         return jsonify({'error': 'Access denied'}), 403
     
-    if not current_user_obj.has_role(UserRole.MANAGER) and user_id != current_user_id:
+    if not actor.has_role('manager') and user_id != current_user_id:
         return jsonify({'error': 'Insufficient permissions'}), 403
     
     data = request.get_json()
@@ -91,13 +90,15 @@ def update_user(user_id):
         user.bio = data['bio']
     
     # Only managers/admins can update these fields
-    if current_user_obj.has_role(UserRole.MANAGER):
+    if actor.has_role('manager'):
         if 'is_active' in data:
             user.is_active = data['is_active']
-        if 'role' in data and current_user_obj.is_admin():
+        if 'role' in data and actor.is_admin():
             user.role = UserRole(data['role'])
     
     db.session.commit()
+    invalidate_user(user_id)
+    invalidate_user_stats(user.organization_id)
     
     return jsonify({
         'success': True,
@@ -105,23 +106,26 @@ def update_user(user_id):
     })
 
 @bp.route('/users/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@jwt_required_with_claims
 @role_required('manager')
 def delete_user(user_id):
     """Delete user (soft delete by deactivation)"""
-    current_user_id = get_jwt_identity()
-    current_user_obj = User.query.get(current_user_id)
+    actor = current_actor()
+    if not actor:
+        return jsonify({'error': 'User not found'}), 404
     
     user = User.query.get_or_404(user_id)
     
-    if user.organization_id != current_user_obj.organization_id:
+    if user.organization_id != actor.organization_id:
         return jsonify({'error': 'Access denied'}), 403
     
-    if user.is_admin() and not current_user_obj.is_admin():
+    if user.is_admin() and not actor.is_admin():
         return jsonify({'error': 'Cannot delete admin users'}), 403
     
     # Soft delete - just deactivate
     user.is_active = False
     db.session.commit()
+    invalidate_user(user_id)
+    invalidate_user_stats(user.organization_id)
     
     return jsonify({'success': True, 'message': 'User deactivated successfully'})
\ No newline at end of file
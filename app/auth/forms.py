@@ -1,19 +1,34 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Regexp, ValidationError
 from app.models.user import User
+import re
+
+# \Z rather than $ so a trailing newline can't slip through
+USERNAME_RE = re.compile(r'[a-zA-Z0-9_-]+\Z')
+
+def _strip(value):
+    return value.strip() if value else value
+
+def _normalize(value):
+    """Strip and lowercase once, before validators and views see the value"""
+    return value.strip().lower() if value else value
 
 class LoginForm(FlaskForm):
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[_normalize], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     remember_me = BooleanField('Remember Me')
     submit = SubmitField('Sign In')
 
 class RegisterForm(FlaskForm):
-    first_name = StringField('First Name', validators=[DataRequired(), Length(min=2, max=50)])
-    last_name = StringField('Last Name', validators=[DataRequired(), Length(min=2, max=50)])
-    username = StringField('Username', validators=[DataRequired(), Length(min=4, max=25)])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    first_name = StringField('First Name', filters=[_strip], validators=[DataRequired(), Length(min=2, max=50)])
+    last_name = StringField('Last Name', filters=[_strip], validators=[DataRequired(), Length(min=2, max=50)])
+    username = StringField('Username', filters=[_normalize], validators=[
+        DataRequired(),
+        Length(min=4, max=25),
+        Regexp(USERNAME_RE, message='Username can only contain letters, numbers, hyphens, and underscores.')
+    ])
+    email = StringField('Email', filters=[_normalize], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[
         DataRequired(),
         Length(min=8, message='Password must be at least 8 characters long')
@@ -24,15 +39,17 @@ class RegisterForm(FlaskForm):
     ])
     submit = SubmitField('Register')
     
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data.lower()).first()
-        if user:
-            raise ValidationError('Username already taken.')
-    
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data.lower()).first()
-        if user:
-            raise ValidationError('Email already registered.')
+    def validate(self, extra_validators=None):
+        # Availability is checked once, for both fields, after the format checks pass
+        if not super().validate(extra_validators):
+            return False
+        
+        conflicts = User.registration_conflicts(self.email.data, self.username.data)
+        if 'username' in conflicts:
+            self.username.errors.append('Username already taken.')
+        if 'email' in conflicts:
+            self.email.errors.append('Email already registered.')
+        return not conflicts
 
 class ResetPasswordForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -51,8 +68,7 @@ class ProfileUpdateForm(FlaskForm):
     
     def validate_username(self, username):
         if username.data != self.original_username:
-            user = User.query.filter_by(username=username.data).first()
-            if user:
+            if User.username_exists(username.data):
                 raise ValidationError('This username is already taken. Please choose a different one.')
 
 class ChangePasswordForm(FlaskForm):
@@ -1,13 +1,13 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from urllib.parse import urlparse
-from datetime import datetime, timezone
 from app import db, limiter
-from app.models.user import User, UserRole
+from app.models.user import User, UserRole, check_dummy_password
 from app.models.organization import Organization
 from app.auth.forms import LoginForm, RegisterForm, ResetPasswordForm
 from app.utils.email import send_verification_email, send_password_reset_email
 from app.utils.decorators import anonymous_required
+from app.utils.helpers import is_safe_redirect
+from app.utils.jwt_cache import invalidate_user
 
 bp = Blueprint('auth', __name__)
 
@@ -17,19 +17,21 @@ bp = Blueprint('auth', __name__)
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data.lower()).first()
+        user = User.find_by_email(form.email.data)
         
-        if user and user.check_password(form.password.data):
+        if user is None:
+            check_dummy_password(form.password.data)
+        elif user.check_password(form.password.data):
             if not user.is_active:
                 flash('Your account has been deactivated.', 'error')
                 return render_template('auth/login.html', form=form)
             
             login_user(user, remember=form.remember_me.data)
-            user.last_login = datetime.now(timezone.utc)
-            db.session.commit()
+            user.rehash_password(form.password.data)
+            user.record_login()
             
             next_page = request.args.get('next')
-            if not next_page or urlparse(next_page).netloc != '':
+            if not next_page or not is_safe_redirect(next_page):
                 next_page = url_for('dashboard.index')
             
             flash(f'Welcome back, {user.first_name}!', 'success')
@@ -50,8 +52,6 @@ def register():
             name=f"{form.first_name.data}'s Organization",
             slug=f"{form.username.data}-org"
         )
-        db.session.add(org)
-        db.session.flush()  # Get the ID
         
         # Create user
         user = User(
@@ -60,15 +60,16 @@ def register():
             first_name=form.first_name.data,
             last_name=form.last_name.data,
             role=UserRole.ADMIN,
-            organization_id=org.id
+            organization=org
         )
         user.set_password(form.password.data)
         
         # Generate verification token
         token = user.generate_verification_token()
         
-        db.session.add(user)
-        org.owner_id = user.id
+        # Link through relationships so a single flush inserts both rows
+        org.owner = user
+        db.session.add_all([org, user])
         db.session.commit()
         
         # Send verification email
@@ -88,11 +89,9 @@ def logout():
 
 @bp.route('/verify-email/<token>')
 def verify_email(token):
-    user = User.query.filter_by(email_verification_token=token).first()
-    if user:
-        user.is_verified = True
-        user.email_verification_token = None
-        db.session.commit()
+    verified = User.consume_verification_token(token)
+    if verified:
+        invalidate_user(verified[0])
         flash('Email verified successfully!', 'success')
     else:
         flash('Invalid or expired verification token.', 'error')
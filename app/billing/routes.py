@@ -1,21 +1,57 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.services.subscription_service import PLAN_PRICE_CENTS
 from app.utils.decorators import role_required
+from app.utils.helpers import checkout_urls
 import stripe
 import os
+from types import MappingProxyType
 
 bp = Blueprint('billing', __name__)
 
 # Configure Stripe
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+
+# Plan lookup tables, built once at import
+_PLAN_PRICES_CENTS = MappingProxyType({plan.value: cents for plan, cents in PLAN_PRICE_CENTS.items() if cents})
+_PLAN_ENUM = MappingProxyType({plan.value: plan for plan in SubscriptionPlan})
+
+# Webhook events we act on; any other verified event is acknowledged as ignored
+_HANDLED_EVENTS = frozenset({
+    'checkout.session.completed',
+    'invoice.payment_succeeded',
+    'invoice.payment_failed',
+})
+
+# Checkout payloads for the paid plans
+_PAYMENT_METHOD_TYPES = ['card']
+_LINE_ITEMS = {
+    plan_key: [{
+        'price_data': {
+            'currency': 'usd',
+            'product_data': {
+                'name': f'{plan_key.title()} Plan',
+            },
+            'unit_amount': unit_amount,  # Stripe uses cents
+            'recurring': {
+                'interval': 'month',
+            },
+        },
+        'quantity': 1,
+    }]
+    for plan_key, unit_amount in _PLAN_PRICES_CENTS.items()
+}
 
 @bp.route('/subscription')
 @login_required
 def subscription():
     """Current subscription details"""
-    subscription = current_user.organization.subscription
+    # Eager-loaded with current_user (see load_user) - no query on the common path
+    organization = current_user.organization
+    subscription = organization.subscription if organization else None
     if not subscription:
         # Create default free subscription
         subscription = Subscription(
@@ -33,33 +69,21 @@ def subscription():
 @role_required('admin')
 def upgrade_plan(plan_key):
     """Upgrade subscription plan"""
-    if plan_key not in ['pro', 'enterprise']:
+    if plan_key not in _PLAN_PRICES_CENTS:
         flash('Invalid plan selected.', 'error')
         return redirect(url_for('billing.subscription'))
     
-    subscription = current_user.organization.subscription
-    
     try:
+        success_url, cancel_url = checkout_urls(request.host_url, 'billing.success', 'billing.subscription')
+        
         # Create Stripe checkout session
         checkout_session = stripe.checkout.Session.create(
             customer_email=current_user.email,
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': 'usd',
-                    'product_data': {
-                        'name': f'{plan_key.title()} Plan',
-                    },
-                    'unit_amount': get_plan_price(plan_key) * 100,  # Stripe uses cents
-                    'recurring': {
-                        'interval': 'month',
-                    },
-                },
-                'quantity': 1,
-            }],
+            payment_method_types=_PAYMENT_METHOD_TYPES,
+            line_items=_LINE_ITEMS[plan_key],
             mode='subscription',
-            success_url=url_for('billing.success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url=url_for('billing.subscription', _external=True),
+            success_url=success_url,
+            cancel_url=cancel_url,
             metadata={
                 'organization_id': current_user.organization_id,
                 'plan': plan_key
@@ -75,17 +99,23 @@ def upgrade_plan(plan_key):
 @bp.route('/webhook', methods=['POST'])
 def stripe_webhook():
     """Handle Stripe webhooks"""
-    payload = request.get_data(as_text=True)
+    if (request.content_length or 0) > current_app.config['STRIPE_WEBHOOK_MAX_BYTES']:
+        abort(413)
+    
+    payload = request.get_data(cache=False)
     sig_header = request.headers.get('Stripe-Signature')
-    webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
     
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
+        event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
     except ValueError:
         return jsonify({'error': 'Invalid payload'}), 400
     except stripe.error.SignatureVerificationError:
         return jsonify({'error': 'Invalid signature'}), 400
     
+    # Filtered only after verification, so unsigned requests never get a 200
+    if event['type'] not in _HANDLED_EVENTS:
+        return jsonify({'status': 'ignored'})
+    
     # Handle different event types
     if event['type'] == 'checkout.session.completed':
         handle_successful_payment(event['data']['object'])
@@ -98,21 +128,12 @@ def stripe_webhook():
 
 def handle_successful_payment(session):
     """Handle successful payment"""
-    org_id = session['metadata']['organization_id']
-    plan_key = session['metadata']['plan']
-    
-    subscription = Subscription.query.filter_by(organization_id=org_id).first()
-    if subscription:
-        subscription.plan = SubscriptionPlan(plan_key)
-        subscription.status = SubscriptionStatus.ACTIVE
-        subscription.stripe_customer_id = session['customer']
-        subscription.stripe_subscription_id = session['subscription']
-        db.session.commit()
-
-def get_plan_price(plan_key):
-    """Get plan price in dollars"""
-    prices = {
-        'pro': 29,
-        'enterprise': 99
-    }
-    return prices.get(plan_key, 0)
+    # One upsert statement: no read, no UPDATE-then-INSERT race between concurrent webhooks
+    Subscription.upsert([{
+        'organization_id': int(session['metadata']['organization_id']),
+        'plan': _PLAN_ENUM[session['metadata']['plan']],
+        'status': SubscriptionStatus.ACTIVE,
+        'stripe_customer_id': session['customer'],
+        'stripe_subscription_id': session['subscription']
+    }])
+    db.session.commit()
@@ -4,14 +4,22 @@ from flask.cli import with_appcontext
 from app import db
 from app.models.user import User, UserRole
 from app.models.organization import Organization
+from werkzeug.security import generate_password_hash
+
+# Low-cost KDF for seed accounts; real accounts use User.set_password
+SEED_PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
 
 def register_commands(app):
     """Register CLI commands with the app"""
     
     @app.cli.command()
+    @click.option('--drop', is_flag=True, help='Drop all tables first (destroys data).')
     @with_appcontext
-    def init_db():
+    def init_db(drop):
         """Initialize the database"""
+        if drop:
+            click.confirm('This will delete all data. Continue?', abort=True)
+            db.drop_all()
         db.create_all()
         click.echo('Database initialized.')
     
@@ -26,8 +34,6 @@ def register_commands(app):
         
         # Create admin organization
         org = Organization(name='Admin Organization', slug='admin-org')
-        db.session.add(org)
-        db.session.flush()
         
         # Create admin user
         admin = User(
@@ -36,13 +42,14 @@ def register_commands(app):
             first_name=first_name,
             last_name=last_name,
             role=UserRole.ADMIN,
-            organization_id=org.id,
+            organization=org,
             is_verified=True
         )
         admin.set_password(password)
         
-        db.session.add(admin)
-        org.owner_id = admin.id
+        # Single flush: INSERT org, INSERT user, then UPDATE owner_id
+        org.owner = admin
+        db.session.add_all([org, admin])
         db.session.commit()
         
         click.echo(f'Admin user created: {email}')
@@ -70,20 +77,49 @@ def register_commands(app):
             ('bob', 'bob@demo.com', 'Bob', 'Johnson', UserRole.USER),
         ]
         
-        for username, email, first_name, last_name, role in users_data:
-            user = User(
+        # Hash the shared demo password once, with a cheap KDF - these are throwaway accounts
+        shared_hash = generate_password_hash('password123', method=SEED_PASSWORD_HASH_METHOD)
+        
+        users = [
+            User(
                 username=username,
                 email=email,
                 first_name=first_name,
                 last_name=last_name,
                 role=role,
                 organization_id=org.id,
-                is_verified=True
+                is_verified=True,
+                password_hash=shared_hash
             )
-            user.set_password('password123')
-            db.session.add(user)
+            for username, email, first_name, last_name, role in users_data
+        ]
+        db.session.bulk_save_objects(users)
         
-        org.owner_id = User.query.filter_by(username='john').first().id
+        org.owner_id = db.session.query(User.id).filter_by(username='john').scalar()
         db.session.commit()
         
-        click.echo('Sample data created successfully!')
\ No newline at end of file
+        click.echo('Sample data created successfully!')
+    
+    @app.cli.command()
+    @click.option('--days', default=365, show_default=True, help='Keep entries newer than this many days.')
+    @click.option('--batch-size', default=10000, show_default=True, help='Rows deleted per transaction.')
+    @with_appcontext
+    def prune_audit_logs(days, batch_size):
+        """Delete audit log entries older than the retention window"""
+        from datetime import datetime, timezone, timedelta
+        from app.models.audit import AuditLog
+        
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        deleted = 0
+        # Small batches (walked via ix_audit_logs_created_at) keep each transaction and its
+        # locks short, so pruning can run alongside live traffic
+        while True:
+            ids = [row.id for row in db.session.query(AuditLog.id)
+                   .filter(AuditLog.created_at < cutoff).limit(batch_size)]
+            if not ids:
+                break
+            db.session.execute(db.delete(AuditLog).where(AuditLog.id.in_(ids)))
+            db.session.commit()
+            deleted += len(ids)
+        
+        click.echo(f'Deleted {deleted} audit log entries older than {days} days.')
@@ -4,7 +4,7 @@ from app import db, cache
 from app.models.user import User
 from app.models.organization import Organization
 from app.utils.decorators import role_required
-from sqlalchemy import func
+from sqlalchemy import func, case
 from datetime import datetime, timedelta
 
 bp = Blueprint('dashboard', __name__)
@@ -13,7 +13,7 @@ bp = Blueprint('dashboard', __name__)
 @login_required
 def index():
     # Get dashboard stats
-    stats = get_dashboard_stats()
+    stats = get_dashboard_stats(current_user.organization_id)
     recent_users = get_recent_users()
     
     return render_template('dashboard/index.html', 
@@ -56,26 +56,20 @@ def settings():
 @login_required
 def api_stats():
     """HTMX endpoint for live dashboard updates"""
-    stats = get_dashboard_stats()
+    stats = get_dashboard_stats(current_user.organization_id)
     return jsonify(stats)
 
-@cache.memoize(timeout=300)  # Cache for 5 minutes
-def get_dashboard_stats():
-    """Get dashboard statistics"""
-    org_id = current_user.organization_id
-    
-    total_users = User.query.filter_by(organization_id=org_id).count()
-    active_users = User.query.filter_by(
-        organization_id=org_id, 
-        is_active=True
-    ).count()
-    
+@cache.memoize(timeout=300)  # Cache for 5 minutes, per organization
+def get_dashboard_stats(org_id):
+    """Get dashboard statistics in one aggregate query"""
     # Users created this month
     month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_users_this_month = User.query.filter(
-        User.organization_id == org_id,
-        User.created_at >= month_start
-    ).count()
+    
+    total_users, active_users, new_users_this_month = db.session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.is_active.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((User.created_at >= month_start, 1), else_=0)), 0)
+    ).filter(User.organization_id == org_id).one()
     
     return {
         'total_users': total_users,
@@ -1,29 +1,139 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort, session, g
 from flask_login import login_user, logout_user, login_required, current_user
-from urllib.parse import urlparse
 from datetime import datetime, timezone
-from app import db, limiter
-from app.models.user import User, UserRole
+from app import db, limiter, cache
+from app.models.user import User, UserRole, check_dummy_password
 from app.models.organization import Organization
 from app.models.enums import SubscriptionStatus, SubscriptionPlan
 from app.auth.forms import LoginForm, RegisterForm, ResetPasswordForm
 from app.utils.email import send_verification_email, send_password_reset_email
 from app.utils.decorators import anonymous_required
+from app.utils.jwt_cache import invalidate_user
+from app.utils.helpers import is_safe_redirect, json_response, checkout_urls
+from app.utils.stats import get_user_stats, get_organization_count, invalidate_user_stats, EMPTY_USER_STATS
 from app.models.subscription import Subscription
 from app.utils.decorators import role_required
-from app.services.subscription_service import SubscriptionService
+from app.services.subscription_service import SubscriptionService, PLAN_PRICE_CENTS
 import stripe
 import os
 from app.auth.forms import ProfileUpdateForm, ChangePasswordForm
-import re
+from sqlalchemy import func, extract
+from sqlalchemy.orm import selectinload, joinedload, raiseload, load_only
+import hashlib
 
 bp = Blueprint('main', __name__)
 
+# Plan catalogue for the pricing page, built once at import
+_PRICING_PLANS = {
+    'free': {
+        'name': 'Free',
+        'price': 0,
+        'features': [
+            'Up to 5 users',
+            'Basic features',
+            '1GB storage',
+            'Community support'
+        ],
+        'recommended': False
+    },
+    'pro': {
+        'name': 'Pro',
+        'price': 29,
+        'features': [
+            'Up to 25 users',
+            'Advanced features',
+            '10GB storage',
+            'Priority support',
+            'Custom branding'
+        ],
+        'recommended': True
+    },
+    'enterprise': {
+        'name': 'Enterprise',
+        'price': 99,
+        'features': [
+            'Unlimited users',
+            'All features',
+            '100GB storage',
+            '24/7 dedicated support',
+            'Custom integrations',
+            'SLA guarantee'
+        ],
+        'recommended': False
+    }
+}
+_PAID_PLANS = frozenset(plan.value for plan, cents in PLAN_PRICE_CENTS.items() if cents)
+
+def _free_org_slug(username):
+    """Get the first unused '<username>-org[-N]' slug, fetching all candidates in one query"""
+    base = f"{username}-org"
+    # autoescape: '_' in usernames is a LIKE wildcard
+    taken = {slug for (slug,) in db.session.query(Organization.slug)
+             .filter(Organization.slug.startswith(base, autoescape=True))}
+    
+    slug, counter = base, 1
+    while slug in taken:
+        slug = f"{base}-{counter}"
+        counter += 1
+    return slug
+
 # Initialize subscription service
 def get_subscription_service():
     """Get subscription service instance"""
     return SubscriptionService()
 
+UTC = timezone.utc
+
+# Columns rendered by dashboard/users.html
+_USER_LIST_COLUMNS = load_only(
+    User.id, User.username, User.email, User.first_name, User.last_name,
+    User.organization_id, User.role, User.is_active, User.is_verified, User.created_at
+)
+
+# Columns login() reads: credentials, status, greeting and the last_login throttle
+_LOGIN_COLUMNS = load_only(
+    User.id, User.password_hash, User.is_active, User.first_name, User.last_login
+)
+
+# Columns resend_verification() reads: status check, token write and the email itself
+_RESEND_COLUMNS = load_only(User.id, User.email, User.first_name, User.is_verified)
+
+# Columns rendered in the admin page's recent registrations table
+_ADMIN_RECENT_USER_COLUMNS = load_only(
+    User.id, User.first_name, User.last_name, User.email, User.organization_id,
+    User.is_active, User.is_verified, User.created_at
+)
+
+# Columns rendered in the dashboard's recent users card
+_RECENT_USER_COLUMNS = load_only(
+    User.id, User.first_name, User.last_name, User.email, User.created_at, User.is_active
+)
+
+def _monthly_counts(created_at, id_column, months=12):
+    """Rows created per month over the last `months` months, as [{'year', 'month', 'count'}]"""
+    now = datetime.now(UTC)
+    year, month = divmod(now.year * 12 + now.month - months, 12)
+    since = datetime(year, month + 1, 1)
+    
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # One date_trunc group key instead of two extract() keys
+        bucket = func.date_trunc('month', created_at).label('bucket')
+        rows = db.session.query(bucket, func.count(id_column)).filter(created_at >= since)\
+                         .group_by(bucket).order_by(bucket).all()
+        return [{'year': bucket.year, 'month': bucket.month, 'count': count} for bucket, count in rows]
+    
+    year_col = extract('year', created_at).label('year')
+    month_col = extract('month', created_at).label('month')
+    rows = db.session.query(year_col, month_col, func.count(id_column)).filter(created_at >= since)\
+                     .group_by(year_col, month_col).order_by(year_col, month_col).all()
+    return [{'year': int(year), 'month': int(month), 'count': count} for year, month, count in rows]
+
+def _loader_options(*options):
+    """Loader options for template-bound queries; under RAISELOAD_STRICT any other lazy load raises"""
+    if current_app.config.get('RAISELOAD_STRICT'):
+        return options + (raiseload('*'),)
+    return options
+
 # Main/Home routes
 @bp.route('/')
 def index():
@@ -31,19 +141,23 @@ def index():
 
 # Auth routes (moved from auth blueprint)
 @bp.route('/login', methods=['GET', 'POST'])
-@limiter.limit("5 per minute")
+# The hourly cap stops slow credential stuffing that stays under the per-minute limit
+@limiter.limit("5 per minute;100 per hour")
 @anonymous_required
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        # Clean and validate email
-        email = form.email.data.lower().strip()
+        # LoginForm has already stripped and lowercased the email
+        email = form.email.data
         password = form.password.data
         
         # Find user by email
-        user = User.query.filter_by(email=email).first()
+        user = User.find_by_email(email, _LOGIN_COLUMNS)
         
-        if user and user.check_password(password):
+        if user is None:
+            # Same KDF cost as a real check, so unknown emails can't be told apart by timing
+            check_dummy_password(password)
+        elif user.check_password(password):
             # Check if account is active
             if not user.is_active:
                 flash('Your account has been deactivated. Please contact support.', 'error')
@@ -53,10 +167,9 @@ def login():
             login_user(user, remember=form.remember_me.data)
             
             # Update last login timestamp
-            user.last_login = datetime.now(timezone.utc)
-            
             try:
-                db.session.commit()
+                user.rehash_password(password)
+                user.record_login()
             except Exception as e:
                 db.session.rollback()
                 print(f"Error updating last login: {e}")
@@ -64,12 +177,9 @@ def login():
             
             # Handle redirect after successful login
             next_page = request.args.get('next')
-            if not next_page or urlparse(next_page).netloc != '':
-                # Default redirect based on user role
-                if user.role == UserRole.ADMIN:
-                    next_page = url_for('main.dashboard')
-                else:
-                    next_page = url_for('main.dashboard')
+            if not next_page or not is_safe_redirect(next_page):
+                # Admins and users share the dashboard
+                next_page = url_for('main.dashboard')
             
             # Success message with user's name
             flash(f'Welcome back, {user.first_name}!', 'success')
@@ -93,63 +203,31 @@ def register():
     form = RegisterForm()
     if form.validate_on_submit():
         try:
-            # Clean form data
-            username = form.username.data.lower().strip()
-            email = form.email.data.lower().strip()
-            first_name = form.first_name.data.strip()
-            last_name = form.last_name.data.strip()
-            
-            # Additional validation
-            if not username or not email or not first_name or not last_name:
-                flash('All fields are required.', 'error')
-                return render_template('auth/register.html', form=form)
-            
-            # Validate username format (alphanumeric, hyphens, underscores only)
-            if not re.match(r'^[a-zA-Z0-9_-]+$', username):
-                flash('Username can only contain letters, numbers, hyphens, and underscores.', 'error')
-                return render_template('auth/register.html', form=form)
-            
-            # Check minimum username length
-            if len(username) < 3:
-                flash('Username must be at least 3 characters long.', 'error')
-                return render_template('auth/register.html', form=form)
+            # Already normalized, format-checked and availability-checked by RegisterForm
+            username = form.username.data
+            email = form.email.data
+            first_name = form.first_name.data
+            last_name = form.last_name.data
             
-            # Check if user already exists
-            existing_user = User.query.filter_by(email=email).first()
-            if existing_user:
-                flash('An account with this email already exists.', 'error')
-                return render_template('auth/register.html', form=form)
-            
-            existing_username = User.query.filter_by(username=username).first()
-            if existing_username:
-                flash('This username is already taken.', 'error')
-                return render_template('auth/register.html', form=form)
-            
-            # STEP 1: Create organization first WITHOUT owner_id
-            org_slug = f"{username}-org"
-            counter = 1
-            while Organization.query.filter_by(slug=org_slug).first():
-                org_slug = f"{username}-org-{counter}"
-                counter += 1
+            # STEP 1: Pick a free organization slug
+            org_slug = _free_org_slug(username)
             
+            # STEP 2: Build organization and owner linked through relationships,
+            # so one flush inserts both (no intermediate flush to fetch the org id)
             org = Organization(
                 name=f"{first_name}'s Organization",
                 slug=org_slug,
                 subscription_plan='free',
-                subscription_status=SubscriptionStatus.TRIAL.value,
-                owner_id=None  # Important: Set to None initially
+                subscription_status=SubscriptionStatus.TRIAL.value
             )
-            db.session.add(org)
-            db.session.flush()  # Get the organization ID without committing
             
-            # STEP 2: Create user with organization_id
             user = User(
                 username=username,
                 email=email,
                 first_name=first_name,
                 last_name=last_name,
                 role=UserRole.ADMIN,
-                organization_id=org.id,  # Now we have the org ID
+                organization=org,
                 is_active=True,
                 is_verified=False  # Will be set to True after email verification
             )
@@ -158,21 +236,22 @@ def register():
             # Generate verification token
             token = user.generate_verification_token()
             
-            db.session.add(user)
-            db.session.flush()  # Get the user ID without committing
-            
-            # STEP 3: Update organization with owner_id
-            org.owner_id = user.id  # Now we can set the owner
+            org.owner = user
+            db.session.add_all([org, user])
+            db.session.flush()
+            # Read now: the service commits, and reading org.id after that would refresh the row
+            org_id = org.id
             
-            # STEP 4: Create subscription using service
+            # STEP 3: Create subscription using service
             subscription_service = get_subscription_service()
             subscription = subscription_service.create_subscription(org, 'free')
             
             # Start trial for new organizations
             subscription.start_trial(days=14)
             
-            # STEP 5: Commit everything together
+            # STEP 4: Commit everything together
             db.session.commit()
+            invalidate_user_stats(org_id)
             
             # Send verification email
             try:
@@ -212,7 +291,7 @@ def api_update_profile():
             current_user.first_name = form.first_name.data.strip()
             current_user.last_name = form.last_name.data.strip()
             current_user.username = form.username.data.lower().strip()
-            current_user.updated_at = datetime.now(timezone.utc)
+            current_user.updated_at = datetime.now(UTC)
             
             db.session.commit()
             
@@ -252,7 +331,7 @@ def api_change_password():
             
             # Update password
             current_user.set_password(form.new_password.data)
-            current_user.updated_at = datetime.now(timezone.utc)
+            current_user.updated_at = datetime.now(UTC)
             
             db.session.commit()
             
@@ -283,8 +362,10 @@ def api_delete_account():
         
         # Delete user account
         # Note: In a real application, you might want to soft delete or handle this differently
+        org_id = current_user.organization_id
         db.session.delete(current_user)
         db.session.commit()
+        invalidate_user_stats(org_id)
         
         # Log user out
         logout_user()
@@ -310,23 +391,21 @@ def verify_email(token):
         flash('Invalid verification link.', 'error')
         return redirect(url_for('main.login'))
     
-    user = User.query.filter_by(email_verification_token=token).first()
+    try:
+        verified = User.consume_verification_token(token)
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while verifying your email. Please try again.', 'error')
+        print(f"Email verification error: {e}")
+        return redirect(url_for('main.login'))
     
-    if user:
-        if user.is_verified:
-            flash('Your email is already verified. You can log in.', 'info')
-        else:
-            user.is_verified = True
-            user.email_verification_token = None
-            
-            try:
-                db.session.commit()
-                flash('Email verified successfully! You can now log in to your account.', 'success')
-            except Exception as e:
-                db.session.rollback()
-                flash('An error occurred while verifying your email. Please try again.', 'error')
-                print(f"Email verification error: {e}")
+    if verified:
+        user_id, organization_id = verified
+        invalidate_user(user_id)
+        invalidate_user_stats(organization_id)
+        flash('Email verified successfully! You can now log in to your account.', 'success')
     else:
+        # Tokens are cleared on use, so this also covers already-verified links
         flash('Invalid or expired verification token. Please request a new verification email.', 'error')
     
     return redirect(url_for('main.login'))
@@ -340,7 +419,7 @@ def resend_verification():
         flash('Email address is required.', 'error')
         return redirect(url_for('main.login'))
     
-    user = User.query.filter_by(email=email.lower().strip()).first()
+    user = User.find_by_email(email, _RESEND_COLUMNS)
     if not user:
         flash('No account found with that email address.', 'error')
         return redirect(url_for('main.login'))
@@ -366,23 +445,22 @@ def resend_verification():
 def dashboard():
     # Get stats for the dashboard
     if current_user.organization_id:
-        org_users = User.query.filter_by(organization_id=current_user.organization_id).all()
-        stats = {
-            'total_users': len(org_users),
-            'active_users': sum(1 for user in org_users if user.is_active),
-            'verified_users': sum(1 for user in org_users if user.is_verified),
-            'admin_users': sum(1 for user in org_users if user.role == UserRole.ADMIN)
-        }
+        stats = get_user_stats(current_user.organization_id)
         
         # Get recent users (last 5)
-        recent_users = User.query.filter_by(organization_id=current_user.organization_id)\
+        recent_users = User.query.options(*_loader_options(_RECENT_USER_COLUMNS))\
+                                 .filter_by(organization_id=current_user.organization_id)\
                                  .order_by(User.created_at.desc())\
                                  .limit(5).all()
         
-        # Get subscription info for dashboard context
+        # Get subscription info for dashboard context - eager-loaded with current_user,
+        # so with stats cached the recent-users SELECT is the page's only query
         try:
-            subscription_service = get_subscription_service()
-            subscription = subscription_service.get_organization_subscription(current_user.organization_id)
+            organization = current_user.organization
+            subscription = organization.subscription if organization else None
+            if subscription is None:
+                subscription_service = get_subscription_service()
+                subscription = subscription_service.get_organization_subscription(current_user.organization_id)
             
             # Add subscription info to stats
             stats['subscription'] = {
@@ -396,13 +474,7 @@ def dashboard():
             stats['subscription'] = None
             
     else:
-        stats = {
-            'total_users': 0, 
-            'active_users': 0, 
-            'verified_users': 0, 
-            'admin_users': 0,
-            'subscription': None
-        }
+        stats = dict(EMPTY_USER_STATS, subscription=None)
         recent_users = []
     
     return render_template('dashboard/index.html', stats=stats, recent_users=recent_users)
@@ -417,20 +489,17 @@ def admin():
         return redirect(url_for('main.dashboard'))
     
     # Get system-wide statistics (all users across all organizations)
-    all_users = User.query.all()
-    stats = {
-        'total_users': len(all_users),
-        'active_users': sum(1 for user in all_users if user.is_active),
-        'verified_users': sum(1 for user in all_users if user.is_verified),
-        'admin_users': sum(1 for user in all_users if user.role == UserRole.ADMIN)
-    }
+    stats = get_user_stats()
     
     # Additional system-wide stats
-    total_organizations = Organization.query.count()
-    stats['total_organizations'] = total_organizations
+    stats['total_organizations'] = get_organization_count()
     
     # Recent registrations (last 10 users across all organizations)
-    recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
+    # admin.html shows each user's organization name
+    recent_users = User.query.options(*_loader_options(
+        _ADMIN_RECENT_USER_COLUMNS,
+        selectinload(User.organization).load_only(Organization.id, Organization.name)
+    )).order_by(User.created_at.desc()).limit(10).all()
     
     return render_template('dashboard/admin.html', stats=stats, recent_users=recent_users)
 
@@ -447,11 +516,13 @@ def users():
         view_all = request.args.get('all', 'false').lower() == 'true'
         
         if view_all:
-            # Show all users across all organizations (super admin view)
-            users = User.query.order_by(User.created_at.desc()).all()
-            # Get all organizations for context
-            organizations = Organization.query.all()
-            org_dict = {org.id: org for org in organizations}
+            # Show all users across all organizations (super admin view); their organizations'
+            # names come back in the same JOINed query (the template only shows names)
+            users = User.query.options(*_loader_options(
+                _USER_LIST_COLUMNS,
+                joinedload(User.organization).load_only(Organization.id, Organization.name)
+            )).order_by(User.created_at.desc()).all()
+            org_dict = {user.organization_id: user.organization for user in users if user.organization}
         else:
             # Show only users from the same organization (organization admin view)
             # Check if current user has an organization
@@ -459,12 +530,13 @@ def users():
                 flash('You are not associated with any organization.', 'error')
                 return redirect(url_for('main.dashboard'))
             
-            users = User.query.filter_by(organization_id=current_user.organization_id)\
+            users = User.query.options(*_loader_options(_USER_LIST_COLUMNS))\
+                             .filter_by(organization_id=current_user.organization_id)\
                              .order_by(User.created_at.desc())\
                              .all()
             
-            # Get the organization object safely
-            organization = Organization.query.get(current_user.organization_id)
+            # Already loaded with current_user (see load_user)
+            organization = current_user.organization
             org_dict = {current_user.organization_id: organization} if organization else {}
         
         return render_template('dashboard/users.html', 
@@ -501,55 +573,22 @@ def profile():
 @login_required
 def api_stats():
     """API endpoint for dashboard statistics"""
-    if current_user.is_admin():
-        # System-wide stats for admins
-        view_type = request.args.get('view', 'organization')  # 'organization' or 'system'
-        
-        if view_type == 'system':
-            all_users = User.query.all()
-            stats = {
-                'total_users': len(all_users),
-                'active_users': sum(1 for user in all_users if user.is_active),
-                'verified_users': sum(1 for user in all_users if user.is_verified),
-                'admin_users': sum(1 for user in all_users if user.role == UserRole.ADMIN),
-                'total_organizations': Organization.query.count()
-            }
-        else:
-            # Organization-specific stats
-            if current_user.organization_id:
-                org_users = User.query.filter_by(organization_id=current_user.organization_id).all()
-                stats = {
-                    'total_users': len(org_users),
-                    'active_users': sum(1 for user in org_users if user.is_active),
-                    'verified_users': sum(1 for user in org_users if user.is_verified),
-                    'admin_users': sum(1 for user in org_users if user.role == UserRole.ADMIN)
-                }
-            else:
-                stats = {
-                    'total_users': 0,
-                    'active_users': 0,
-                    'verified_users': 0,
-                    'admin_users': 0
-                }
+    # Admins may ask for system-wide stats; everyone else sees their organization
+    if current_user.is_admin() and request.args.get('view', 'organization') == 'system':
+        stats = get_user_stats()
+        stats['total_organizations'] = get_organization_count()
+    elif current_user.organization_id:
+        stats = get_user_stats(current_user.organization_id)
     else:
-        # Non-admin users only see their organization stats
-        if current_user.organization_id:
-            org_users = User.query.filter_by(organization_id=current_user.organization_id).all()
-            stats = {
-                'total_users': len(org_users),
-                'active_users': sum(1 for user in org_users if user.is_active),
-                'verified_users': sum(1 for user in org_users if user.is_verified),
-                'admin_users': sum(1 for user in org_users if user.role == UserRole.ADMIN)
-            }
-        else:
-            stats = {
-                'total_users': 0,
-                'active_users': 0,
-                'verified_users': 0,
-                'admin_users': 0
-            }
+        stats = dict(EMPTY_USER_STATS)
     
-    return jsonify(stats)
+    # Stats are memoized for 60s server-side, so browsers may reuse them for 30s; after
+    # that pollers revalidate with If-None-Match and get an empty 304 while unchanged
+    response = json_response(stats)
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=8).hexdigest(), weak=True)
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response.make_conditional(request)
 
 @bp.route('/admin/analytics')
 @login_required
@@ -557,39 +596,25 @@ def api_stats():
 def admin_analytics():
     """System-wide analytics for admins"""
     try:
-        # User registration trends
-        from sqlalchemy import func, extract
-        
-        # Users registered per month (last 12 months)
-        monthly_registrations = db.session.query(
-            extract('year', User.created_at).label('year'),
-            extract('month', User.created_at).label('month'),
-            func.count(User.id).label('count')
-        ).group_by('year', 'month').order_by('year', 'month').all()
-        
-        # Organization growth
-        monthly_orgs = db.session.query(
-            extract('year', Organization.created_at).label('year'),
-            extract('month', Organization.created_at).label('month'),
-            func.count(Organization.id).label('count')
-        ).group_by('year', 'month').order_by('year', 'month').all()
-        
-        # Active users by organization
-        org_stats = db.session.query(
-            Organization.name,
+        # Users registered per month (last 12 months) and organization growth;
+        # the created_at range is served by ix_users_created_at / ix_organizations_created_at
+        monthly_registrations = _monthly_counts(User.created_at, User.id)
+        monthly_orgs = _monthly_counts(Organization.created_at, Organization.id)
+        
+        # Active users by organization - aggregated on users alone (index-only over
+        # ix_users_org_stats), then joined to organizations once per group for the name
+        user_counts = db.session.query(
+            User.organization_id,
             func.count(User.id).label('total_users'),
             func.sum(User.is_active.cast(db.Integer)).label('active_users')
-        ).join(User).group_by(Organization.id).all()
+        ).group_by(User.organization_id).subquery()
+        org_stats = db.session.query(
+            Organization.name, user_counts.c.total_users, user_counts.c.active_users
+        ).join(user_counts, user_counts.c.organization_id == Organization.id).all()
         
         analytics_data = {
-            'monthly_registrations': [
-                {'year': int(r.year), 'month': int(r.month), 'count': r.count}
-                for r in monthly_registrations
-            ],
-            'monthly_organizations': [
-                {'year': int(r.year), 'month': int(r.month), 'count': r.count}
-                for r in monthly_orgs
-            ],
+            'monthly_registrations': monthly_registrations,
+            'monthly_organizations': monthly_orgs,
             'organization_stats': [
                 {'name': r.name, 'total_users': r.total_users, 'active_users': r.active_users}
                 for r in org_stats
@@ -605,8 +630,13 @@ def admin_analytics():
 
 # API routes
 @bp.route('/api/v1/health')
+@limiter.exempt
 def api_health():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now(timezone.utc).isoformat()})
+    # orjson writes aware datetimes as RFC 3339 natively, same text as .isoformat()
+    response = json_response({'status': 'healthy', 'timestamp': datetime.now(UTC)})
+    # Lets proxies answer repeated liveness polls for a few seconds
+    response.headers['Cache-Control'] = 'public, max-age=5'
+    return response
 
 # SUBSCRIPTION ROUTES - Updated to use service consistently
 
@@ -615,8 +645,13 @@ def api_health():
 def subscription():
     """Current subscription details"""
     try:
-        subscription_service = get_subscription_service()
-        subscription = subscription_service.get_organization_subscription(current_user.organization_id)
+        # Organization and subscription are eager-loaded with current_user (see load_user),
+        # so this costs no extra queries; the service only runs to create a missing one
+        organization = current_user.organization
+        subscription = organization.subscription if organization else None
+        if subscription is None:
+            subscription_service = get_subscription_service()
+            subscription = subscription_service.get_organization_subscription(current_user.organization_id)
         
         return render_template('pricing.html', subscription=subscription)
     
@@ -625,49 +660,17 @@ def subscription():
         flash('Error loading subscription information. Please try again.', 'error')
         return redirect(url_for('main.dashboard'))
 
+def _personalized_page():
+    """Pages for signed-in users or with a pending flash message can't be shared"""
+    return current_user.is_authenticated or '_flashes' in session
+
 @bp.route('/pricing')
+@cache.cached(timeout=300, key_prefix='view/pricing/anonymous', unless=_personalized_page,
+              response_filter=lambda response: not g.get('pricing_fallback'))
 def pricing():
     """Display subscription plans and pricing"""
     try:
-        # Define plan prices with detailed information
-        plans = {
-            'free': {
-                'name': 'Free',
-                'price': 0,
-                'features': [
-                    'Up to 5 users',
-                    'Basic features',
-                    '1GB storage',
-                    'Community support'
-                ],
-                'recommended': False
-            },
-            'pro': {
-                'name': 'Pro',
-                'price': 29,
-                'features': [
-                    'Up to 25 users',
-                    'Advanced features',
-                    '10GB storage',
-                    'Priority support',
-                    'Custom branding'
-                ],
-                'recommended': True
-            },
-            'enterprise': {
-                'name': 'Enterprise',
-                'price': 99,
-                'features': [
-                    'Unlimited users',
-                    'All features',
-                    '100GB storage',
-                    '24/7 dedicated support',
-                    'Custom integrations',
-                    'SLA guarantee'
-                ],
-                'recommended': False
-            }
-        }
+        plans = _PRICING_PLANS
         
         # Check if user is logged in and get their current subscription
         current_subscription = None
@@ -684,6 +687,7 @@ def pricing():
     except Exception as e:
         # Log the error for debugging
         current_app.logger.error(f"Error loading pricing page: {str(e)}")
+        g.pricing_fallback = True  # never cache the fallback page
         
         # Fallback plans in case of error
         fallback_plans = {
@@ -700,7 +704,7 @@ def pricing():
 @role_required('admin')
 def upgrade_plan(plan_key):
     """Upgrade subscription plan"""
-    if plan_key not in ['pro', 'enterprise']:
+    if plan_key not in _PAID_PLANS:
         flash('Invalid plan selected.', 'error')
         return redirect(url_for('main.subscription'))
     
@@ -715,8 +719,7 @@ def upgrade_plan(plan_key):
             flash(f'You are already on the {plan_key.title()} plan.', 'info')
             return redirect(url_for('main.subscription'))
         
-        success_url = url_for('main.payment_success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}'
-        cancel_url = url_for('main.subscription', _external=True)
+        success_url, cancel_url = checkout_urls(request.host_url, 'main.payment_success', 'main.subscription')
         
         checkout_session = subscription_service.create_stripe_checkout_session(
             current_user.organization,
@@ -739,17 +742,25 @@ def payment_success():
     session_id = request.args.get('session_id')
     if session_id:
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
-            if session.payment_status == 'paid':
-                # Update subscription using service
-                subscription_service = get_subscription_service()
-                organization_id = session['metadata']['organization_id']
-                plan_key = session['metadata']['plan']
-                
+            # 'paid' is final, so a paid session's metadata is cached and refreshes or
+            # back-button visits skip the Stripe round-trip
+            cache_key = f'stripe:checkout:{session_id}'
+            paid = cache.get(cache_key)
+            if paid is None:
+                checkout_session = stripe.checkout.Session.retrieve(session_id)
+                if checkout_session.payment_status == 'paid':
+                    paid = {
+                        'organization_id': int(checkout_session['metadata']['organization_id']),
+                        'plan': checkout_session['metadata']['plan']
+                    }
+                    cache.set(cache_key, paid, timeout=600)
+            
+            if paid:
                 # The webhook should handle this, but let's be safe
-                subscription = subscription_service.get_organization_subscription(organization_id)
-                if subscription:
-                    subscription.upgrade_plan(plan_key)
+                subscription_service = get_subscription_service()
+                subscription = subscription_service.get_organization_subscription(paid['organization_id'])
+                if subscription and (subscription.plan.value != paid['plan'] or subscription.is_trialing):
+                    subscription.upgrade_plan(paid['plan'])
                     db.session.commit()
                 
                 flash('Payment successful! Your subscription has been upgraded.', 'success')
@@ -867,24 +878,48 @@ def subscription_analytics():
 @bp.route('/webhook/stripe', methods=['POST'])
 def stripe_webhook():
     """Handle Stripe webhooks"""
-    payload = request.get_data(as_text=True)
+    if (request.content_length or 0) > current_app.config['STRIPE_WEBHOOK_MAX_BYTES']:
+        abort(413)
+    
+    # Raw bytes, read once: construct_event takes bytes and nothing else reuses the body
+    payload = request.get_data(cache=False)
     sig_header = request.headers.get('Stripe-Signature')
     webhook_secret = current_app.config.get('STRIPE_WEBHOOK_SECRET')
     
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
-        
-        subscription_service = get_subscription_service()
-        subscription_service.handle_webhook_event(event)
-        
-        return jsonify({'status': 'success'})
-        
     except ValueError as e:
         current_app.logger.error(f"Invalid webhook payload: {e}")
         return jsonify({'error': 'Invalid payload'}), 400
     except stripe.error.SignatureVerificationError as e:
         current_app.logger.error(f"Invalid webhook signature: {e}")
         return jsonify({'error': 'Invalid signature'}), 400
+    
+    # Stripe delivers at least once: claim the event id (SET NX on Redis) so retries and
+    # duplicate deliveries are acknowledged without re-running the handlers
+    event_key = f"stripe:event:{event['id']}"
+    if not cache.add(event_key, 1, timeout=86400):
+        return jsonify({'status': 'duplicate'})
+    
+    try:
+        # Handlers call back into the Stripe API; with a broker, acknowledge right after
+        # verification and let a worker do that work (Celery retries on failure)
+        if current_app.config.get('CELERY_BROKER_URL'):
+            from app.tasks import handle_stripe_event_task
+            handle_stripe_event_task.delay(event.to_dict_recursive())
+            return jsonify({'status': 'queued'})
+        
+        subscription_service = get_subscription_service()
+        subscription_service.handle_webhook_event(event)
+        
+        return jsonify({'status': 'success'})
+        
     except Exception as e:
+        # Release the claim so Stripe's retry is processed
+        cache.delete(event_key)
         current_app.logger.error(f"Webhook error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+    except BaseException:
+        # Worker timeouts/shutdowns too - never leave an unprocessed event claimed
+        cache.delete(event_key)
+        raise
@@ -18,8 +18,11 @@ def setup_model_relationships():
                                       backref=db.backref('users', lazy='dynamic'))
     
     # Setup Organization -> User (owner) relationship  
+    # post_update breaks the org <-> owner insert cycle: both rows are inserted in one
+    # flush and owner_id is filled in by a follow-up UPDATE in the same transaction
     Organization.owner = db.relationship('User',
                                        foreign_keys=[Organization.owner_id],
+                                       post_update=True,
                                        backref=db.backref('owned_organizations', lazy='dynamic'))
 
 # Call this function after app initialization
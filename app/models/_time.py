@@ -0,0 +1,6 @@
+# app/models/_time.py - Shared timestamp callable for model column defaults
+from datetime import datetime, timezone
+from functools import partial
+
+# One callable reused by every created_at/updated_at default and onupdate
+utcnow = partial(datetime.now, timezone.utc)
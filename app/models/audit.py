@@ -1,5 +1,5 @@
 from app import db
-from datetime import datetime, timezone
+from app.models._time import utcnow
 from enum import Enum
 
 class AuditAction(Enum):
@@ -13,6 +13,15 @@ class AuditAction(Enum):
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        # Audit listings: newest entries for an organization or a user, LIMIT-ed
+        db.Index('ix_audit_logs_org_created_at', 'organization_id', db.text('created_at DESC')),
+        db.Index('ix_audit_logs_user_created_at', 'user_id', db.text('created_at DESC')),
+        # History of a single resource
+        db.Index('ix_audit_logs_resource', 'resource_type', 'resource_id'),
+        # Retention: `flask prune-audit-logs` deletes by age
+        db.Index('ix_audit_logs_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -35,7 +44,7 @@ class AuditLog(db.Model):
     organization = db.relationship('Organization')
     
     # Timestamp
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
     
     def __repr__(self):
         return f'<AuditLog {self.action.value} on {self.resource_type}>'
@@ -51,23 +60,73 @@ class AuditLog(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
-def log_audit(user_id, action, resource_type, resource_id=None, details=None, request=None):
-    """Create audit log entry"""
-    from flask import request as flask_request
+def log_audit(user_id, action, resource_type, resource_id=None, details=None, request=None,
+              organization_id=None):
+    """Record an audit log entry; inside a request it is buffered until the view returns (see flush_audit_buffer)"""
+    from flask import g, has_request_context, request as flask_request
+    from flask_login import current_user
     
-    if request is None:
+    if request is None and has_request_context():
         request = flask_request
     
-    log = AuditLog(
-        user_id=user_id,
-        action=action,
-        resource_type=resource_type,
-        resource_id=resource_id,
-        details=details,
-        ip_address=request.remote_addr if request else None,
-        user_agent=request.headers.get('User-Agent') if request else None,
-        organization_id=getattr(User.query.get(user_id), 'organization_id', None)
-    )
+    # The acting user is usually current_user, whose organization_id is already loaded
+    if organization_id is None and has_request_context() \
+            and current_user.is_authenticated and current_user.id == user_id:
+        organization_id = current_user.organization_id
+    
+    entry = {
+        'user_id': user_id,
+        'action': action,
+        'resource_type': resource_type,
+        'resource_id': resource_id,
+        'details': details,
+        'ip_address': request.remote_addr if request else None,
+        'user_agent': request.headers.get('User-Agent') if request else None,
+        'created_at': utcnow()
+    }
+    if organization_id is not None:
+        entry['organization_id'] = organization_id
+    
+    if has_request_context():
+        g.setdefault('audit_buffer', []).append(entry)
+    else:
+        log_audit_bulk([entry])
+
+def log_audit_bulk(entries):
+    """Insert audit log entries with one multi-row INSERT and a single commit"""
+    from app.models.user import User
     
-    db.session.add(log)
+    if not entries:
+        return
+    
+    # One lookup for every actor's organization instead of a User load per entry
+    user_ids = {entry['user_id'] for entry in entries if 'organization_id' not in entry}
+    org_ids = dict(
+        db.session.query(User.id, User.organization_id).filter(User.id.in_(user_ids))
+    ) if user_ids else {}
+    
+    rows = [
+        dict(entry, organization_id=entry.get('organization_id', org_ids.get(entry['user_id'])))
+        for entry in entries
+    ]
+    db.session.execute(AuditLog.__table__.insert(), rows)
     db.session.commit()
+
+def flush_audit_buffer(response):
+    """after_request hook: write the request's buffered audit entries in one batch.
+    
+    Runs before the response is sent, so the insert is still part of the request's latency.
+    It commits the shared db.session, which also commits anything else the view left
+    pending; views here commit their own work first, so that is normally nothing.
+    """
+    from flask import g, current_app
+    
+    entries = g.pop('audit_buffer', None)
+    if entries:
+        try:
+            log_audit_bulk(entries)
+        except Exception:
+            # Don't leave a failed transaction on the session for teardown
+            db.session.rollback()
+            current_app.logger.exception(f"Error writing {len(entries)} audit log entries")
+    return response
@@ -5,6 +5,7 @@ class SubscriptionStatus(Enum):
     TRIAL = 'TRIAL'          
     EXPIRED = 'EXPIRED'      
     CANCELLED = 'CANCELLED'
+    PAST_DUE = 'PAST_DUE'
 
 class SubscriptionPlan(Enum):
     FREE = 'free'
@@ -1,13 +1,7 @@
 # app/models/organization.py
 from app import db
-from datetime import datetime, timezone
-from enum import Enum
-
-class SubscriptionStatus(Enum):
-    ACTIVE = "ACTIVE"
-    TRIAL = "TRIAL"  
-    EXPIRED = "EXPIRED"
-    CANCELLED = "CANCELLED"
+from app.models._time import utcnow
+from app.models.enums import SubscriptionStatus
 
 class Organization(db.Model):
     __tablename__ = 'organizations'
@@ -34,10 +28,10 @@ class Organization(db.Model):
                         db.ForeignKey('users.id', use_alter=True, name='fk_org_owner'), 
                         nullable=True)
     
-    # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
-                          onupdate=lambda: datetime.now(timezone.utc))
+    # Timestamps - created_at indexed for the admin growth-by-month range scan
+    created_at = db.Column(db.DateTime, default=utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=utcnow,
+                          onupdate=utcnow)
     
     def __repr__(self):
         return f'<Organization {self.name}>'
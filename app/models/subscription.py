@@ -1,18 +1,46 @@
-import enum
 from datetime import datetime, timezone, timedelta
+from types import MappingProxyType
 from app import db
+from app.models._time import utcnow
+# One definition shared by every model and view, so enum comparisons can't silently miss
+from app.models.enums import SubscriptionStatus, SubscriptionPlan
 
-class SubscriptionStatus(enum.Enum):
-    ACTIVE = 'ACTIVE'        # Match database values
-    TRIAL = 'TRIAL'          
-    EXPIRED = 'EXPIRED'      
-    CANCELLED = 'CANCELLED'  
-    PAST_DUE = 'PAST_DUE'   # If you're using this
+# Built once at import; read-only views so no caller can mutate a shared plan table
+_PLAN_FEATURES = MappingProxyType({
+    SubscriptionPlan.FREE: MappingProxyType({
+        'users': 5,
+        'storage': '1GB',
+        'support': 'Basic',
+        'analytics': False,
+        'api_access': False,
+        'custom_domain': False
+    }),
+    SubscriptionPlan.PRO: MappingProxyType({
+        'users': 25,
+        'storage': '10GB',
+        'support': 'Priority',
+        'analytics': True,
+        'api_access': True,
+        'custom_domain': True
+    }),
+    SubscriptionPlan.ENTERPRISE: MappingProxyType({
+        'users': 'Unlimited',
+        'storage': '100GB',
+        'support': '24/7 Premium',
+        'analytics': True,
+        'api_access': True,
+        'custom_domain': True
+    })
+})
+_NO_FEATURES = MappingProxyType({})
 
-class SubscriptionPlan(enum.Enum):
-    FREE = 'free'
-    PRO = 'pro'
-    ENTERPRISE = 'enterprise'
+# Monthly price in cents - the one source for Stripe, PayPal, the billing blueprint and
+# plan_price. Integer cents so no float ever reaches a payment amount
+PLAN_PRICE_CENTS = MappingProxyType({
+    SubscriptionPlan.FREE: 0,
+    SubscriptionPlan.PRO: 2999,
+    SubscriptionPlan.ENTERPRISE: 9999
+})
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
@@ -42,8 +70,8 @@ class Subscription(db.Model):
     trial_end = db.Column(db.DateTime, nullable=True)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     
     # Relationships
     organization = db.relationship('Organization', backref=db.backref('subscription', uselist=False))
@@ -51,6 +79,31 @@ class Subscription(db.Model):
     def __repr__(self):
         return f'<Subscription {self.organization.name} - {self.plan.value}>'
     
+    @classmethod
+    def upsert(cls, rows):
+        """Insert or update subscriptions keyed by organization_id in a single statement"""
+        now = datetime.now(timezone.utc)
+        rows = [dict(row, updated_at=now) for row in rows]
+        columns = [key for key in rows[0] if key != 'organization_id']
+        dialect = db.session.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(cls).values(rows)
+            stmt = stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in columns})
+        else:
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(cls).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['organization_id'],
+                set_={col: stmt.excluded[col] for col in columns}
+            )
+        
+        db.session.execute(stmt)
+    
     @property
     def is_active(self):
         return self.status in [SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL]
@@ -61,7 +114,7 @@ class Subscription(db.Model):
     
     @property
     def is_past_due(self):
-        return self.status == SubscriptionStatus.PAST_DUE if hasattr(SubscriptionStatus, 'PAST_DUE') else False
+        return self.status == SubscriptionStatus.PAST_DUE
     
     @property
     def days_remaining_in_trial(self):
@@ -72,42 +125,12 @@ class Subscription(db.Model):
     
     @property
     def plan_features(self):
-        features = {
-            SubscriptionPlan.FREE: {
-                'users': 5,
-                'storage': '1GB',
-                'support': 'Basic',
-                'analytics': False,
-                'api_access': False,
-                'custom_domain': False
-            },
-            SubscriptionPlan.PRO: {
-                'users': 25,
-                'storage': '10GB',
-                'support': 'Priority',
-                'analytics': True,
-                'api_access': True,
-                'custom_domain': True
-            },
-            SubscriptionPlan.ENTERPRISE: {
-                'users': 'Unlimited',
-                'storage': '100GB',
-                'support': '24/7 Premium',
-                'analytics': True,
-                'api_access': True,
-                'custom_domain': True
-            }
-        }
-        return features.get(self.plan, {})
+        return _PLAN_FEATURES.get(self.plan, _NO_FEATURES)
     
     @property
     def plan_price(self):
-        prices = {
-            SubscriptionPlan.FREE: 0,
-            SubscriptionPlan.PRO: 29,
-            SubscriptionPlan.ENTERPRISE: 99
-        }
-        return prices.get(self.plan, 0)
+        # Display only, e.g. 29.99
+        return PLAN_PRICE_CENTS.get(self.plan, 0) / 100
     
     def start_trial(self, days=14):
         """Start a free trial for the organization"""
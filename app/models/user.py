@@ -1,17 +1,76 @@
 from enum import Enum
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import event, DDL
+from sqlalchemy.orm import validates
 from app import db, login_manager
+from app.models._time import utcnow
+import hashlib
 import secrets
 import string
 
+def hash_token(token):
+    """SHA-256 hex digest of a one-time token; only the digest is stored"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+# Hash of a random password, checked against when a login email doesn't exist so
+# unknown and known emails cost the same KDF time (no user-enumeration timing gap).
+# Built on first use with the same method set_password uses, not at import
+@lru_cache(maxsize=8)
+def _dummy_password_hash(method):
+    password = secrets.token_urlsafe(16)
+    return generate_password_hash(password, method=method) if method else generate_password_hash(password)
+
+def check_dummy_password(password):
+    """Burn one password check's worth of CPU; always returns False"""
+    check_password_hash(_dummy_password_hash(current_app.config.get('PASSWORD_HASH_METHOD')), password)
+    return False
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    """Method/parameter prefix werkzeug writes for a hashing method, computed once per method"""
+    return _dummy_password_hash(method).split('$', 1)[0]
+
+# last_login is only rewritten when the stored value is older than this
+LAST_LOGIN_RESOLUTION = timedelta(hours=1)
+
+# Columns covered by the admin/API user search
+SEARCH_COLUMNS = ('username', 'email', 'first_name', 'last_name')
+
 class UserRole(Enum):
     ADMIN = 'admin'
     USER = 'user'
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = tuple(
+        # Prefix (LIKE 'abc%') searches - index range scans on Postgres. Elsewhere these would
+        # only duplicate the plain column indexes, so they are Postgres-only
+        db.Index(f'ix_users_{col}_pattern', col,
+                 postgresql_ops={col: 'text_pattern_ops'}).ddl_if(dialect='postgresql')
+        for col in SEARCH_COLUMNS
+    ) + tuple(
+        # Substring (LIKE '%abc%') searches - served by pg_trgm
+        db.Index(f'ix_users_{col}_trgm', col, postgresql_using='gin',
+                 postgresql_ops={col: 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+        for col in SEARCH_COLUMNS
+    ) + (
+        # Keeps the verified-user count index-only (partial index, Postgres-only like the
+        # ACL index below; elsewhere neither beats the existing indexes)
+        db.Index('ix_users_verified', 'is_verified',
+                 postgresql_where=db.text('is_verified')).ddl_if(dialect='postgresql'),
+        # Index-only per-organization stats aggregation (see app.utils.stats.get_user_stats)
+        db.Index('ix_users_org_stats', 'organization_id', 'is_active', 'is_verified', 'role'),
+        # Only pending verifications are indexed, so the index stays tiny
+        db.Index('ix_users_email_verification_token_hash', 'email_verification_token_hash', unique=True,
+                 postgresql_where=db.text('email_verification_token_hash IS NOT NULL'),
+                 sqlite_where=db.text('email_verification_token_hash IS NOT NULL')),
+        # Index-only scans for the API permission check (see load_actor)
+        db.Index('ix_users_acl', 'id', postgresql_include=['organization_id', 'role']).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False, index=True)
@@ -30,43 +89,196 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
     
-    # Email verification
-    email_verification_token = db.Column(db.String(100), nullable=True)
+    # Email verification - the raw token only ever goes out in the email
+    email_verification_token_hash = db.Column(db.String(64), nullable=True)
     email_verified_at = db.Column(db.DateTime, nullable=True)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
-                          onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, 
+                          onupdate=utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
     
+    @validates('email')
+    def normalize_email(self, key, email):
+        # Stored lowercase so lower(email) lookups and the unique email index agree
+        return email.strip().lower() if email else email
+    
+    @classmethod
+    def find_by_email(cls, email, *options):
+        """Get a user by email, case-insensitively (served by ux_users_email_lower)"""
+        return cls.query.options(*options).filter(db.func.lower(cls.email) == email.strip().lower()).first()
+    
+    @classmethod
+    def registration_conflicts(cls, email, username):
+        """Get which of 'email'/'username' are already taken, in one query over both unique indexes"""
+        email = email.strip().lower()
+        taken = db.session.query(cls.email, cls.username).filter(
+            db.or_(db.func.lower(cls.email) == email, cls.username == username)
+        ).all()
+        conflicts = set()
+        for row in taken:
+            if row.email.lower() == email:
+                conflicts.add('email')
+            if row.username == username:
+                conflicts.add('username')
+        return conflicts
+    
+    @classmethod
+    def username_exists(cls, username):
+        """Check whether a username is taken with a SELECT EXISTS, without loading the row"""
+        return db.session.query(cls.query.filter_by(username=username).exists()).scalar()
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # PASSWORD_HASH_METHOD lets tests trade KDF cost for speed
+        method = current_app.config.get('PASSWORD_HASH_METHOD')
+        if method:
+            self.password_hash = generate_password_hash(password, method=method)
+        else:
+            self.password_hash = generate_password_hash(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def rehash_password(self, password):
+        """Re-hash a just-verified password if it was stored with outdated KDF parameters"""
+        if self.password_hash.split('$', 1)[0] == _hash_prefix(current_app.config.get('PASSWORD_HASH_METHOD')):
+            return False
+        self.set_password(password)
+        db.session.commit()
+        return True
+    
     def is_admin(self):
         return self.role == UserRole.ADMIN
     
     def generate_verification_token(self, length=32):
         """Generate a random verification token"""
         alphabet = string.ascii_letters + string.digits
-        self.email_verification_token = ''.join(secrets.choice(alphabet) for _ in range(length))
-        return self.email_verification_token
+        token = ''.join(secrets.choice(alphabet) for _ in range(length))
+        self.email_verification_token_hash = hash_token(token)
+        return token
+    
+    @classmethod
+    def consume_verification_token(cls, token):
+        """Mark the token's owner verified in one atomic UPDATE; returns (id, organization_id) or None"""
+        token_hash = hash_token(token)
+        stmt = db.update(cls).where(cls.email_verification_token_hash == token_hash).values(
+            is_verified=True,
+            email_verification_token_hash=None,
+            email_verified_at=datetime.now(timezone.utc)
+        )
+        
+        if db.session.get_bind().dialect.update_returning:
+            row = db.session.execute(stmt.returning(cls.id, cls.organization_id)).first()
+        else:
+            # No UPDATE ... RETURNING (MySQL): look up first; the token condition keeps it single-use
+            row = db.session.execute(
+                db.select(cls.id, cls.organization_id).where(cls.email_verification_token_hash == token_hash)
+            ).first()
+            if row and db.session.execute(stmt).rowcount != 1:
+                row = None
+        
+        db.session.commit()
+        return row
     
     def verify_email(self, token):
         """Verify email with token"""
-        if self.email_verification_token == token:
+        if self.email_verification_token_hash == hash_token(token):
             self.is_verified = True
-            self.email_verification_token = None
+            self.email_verification_token_hash = None
             self.email_verified_at = datetime.now(timezone.utc)
             return True
         return False
 
+    def record_login(self):
+        """Stamp last_login with a targeted UPDATE, at most once per LAST_LOGIN_RESOLUTION"""
+        now = datetime.now(timezone.utc)
+        last_login = self.last_login
+        if last_login is not None:
+            if last_login.tzinfo is None:
+                last_login = last_login.replace(tzinfo=timezone.utc)
+            if now - last_login < LAST_LOGIN_RESOLUTION:
+                return False
+        
+        if current_app.config.get('CELERY_BROKER_URL'):
+            from app.tasks import record_login_task
+            try:
+                # Takes the UPDATE + commit off the login request
+                record_login_task.delay(self.id, now.isoformat())
+                return True
+            except Exception as e:
+                current_app.logger.error(f"Error queueing last_login update, writing inline: {e}")
+        
+        User.set_last_login(self.id, now)
+        return True
+    
+    @staticmethod
+    def set_last_login(user_id, when):
+        """Single-column UPDATE of last_login that never moves it backwards"""
+        db.session.execute(
+            db.update(User)
+            .where(User.id == user_id, db.or_(User.last_login.is_(None), User.last_login < when))
+            .values(last_login=when)
+        )
+        db.session.commit()
+    
+    @staticmethod
+    def search_clause(search):
+        """Get the prebuilt search clause and its :q value, preferring an indexable prefix match"""
+        if search.startswith('%'):
+            return _SUBSTRING_SEARCH, f"%{search.strip('%')}%"
+        return _PREFIX_SEARCH, f'{search}%'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'role': self.role.value if self.role else None,
+            'organization_id': self.organization_id,
+            'is_active': self.is_active,
+            'is_verified': self.is_verified,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_login': self.last_login.isoformat() if self.last_login else None
+        }
+
+# Search clauses are built once with a :q bind parameter, so each request reuses the
+# same SQL instead of building and compiling a new expression (see User.search_clause)
+_PREFIX_SEARCH = db.or_(*(getattr(User, col).like(db.bindparam('q')) for col in SEARCH_COLUMNS))
+_SUBSTRING_SEARCH = db.or_(*(getattr(User, col).ilike(db.bindparam('q')) for col in SEARCH_COLUMNS))
+
+# Newest-users-per-organization lists (ORDER BY created_at DESC LIMIT n) walk this in order
+db.Index('ix_users_org_created_at', User.organization_id, User.created_at.desc())
+
+# Admin analytics' last-12-months registration range scan
+db.Index('ix_users_created_at', User.created_at)
+
+# Case-insensitive login lookups (func.lower(User.email) == ...) stay a single index probe
+db.Index('ux_users_email_lower', db.func.lower(User.email), unique=True)
+
+# gin_trgm_ops needs the pg_trgm extension before the users indexes are built
+event.listen(
+    User.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
 @login_manager.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    from sqlalchemy.orm import joinedload, raiseload
+    from app.models.organization import Organization
+    from app.models.subscription import Subscription
+    
+    # Load user -> organization -> subscription in one joined SELECT instead of lazily per access;
+    # both hops are many-to-one / one-to-one, so the join never multiplies rows
+    options = [joinedload(User.organization).joinedload(Organization.subscription)]
+    if current_app.config.get('RAISELOAD_STRICT'):
+        # Fail fast on any other lazy load hanging off current_user
+        options.append(raiseload('*'))
+    
+    return User.query.options(*options).get(int(id))
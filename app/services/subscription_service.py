@@ -4,9 +4,20 @@ import json
 from datetime import datetime, timezone, timedelta
 from flask import current_app
 from app import db
-from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+# PLAN_PRICE_CENTS lives with the model (plan_price reads it); re-exported for the views
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus, PLAN_PRICE_CENTS
 from app.models.organization import Organization
 
+# One process-wide HTTP client: its pooled requests.Session keeps connections to
+# api.stripe.com alive, so checkout/retrieve calls skip the TCP + TLS handshake.
+# The 10s timeout (library default is 80s) keeps a stalled Stripe call from pinning a worker
+_stripe_session = requests.Session()
+_stripe_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32))
+stripe.default_http_client = stripe.http_client.RequestsClient(session=_stripe_session, timeout=10)
+# Retry 409/429/5xx and connection errors with the library's jittered exponential
+# backoff (it honours Stripe-Should-Retry and sends idempotency keys on POSTs)
+stripe.max_network_retries = 2
+
 class PayPalClient:
     def __init__(self, client_id, client_secret, sandbox=True):
         self.client_id = client_id
@@ -205,7 +216,7 @@ class SubscriptionService:
                     "description": f"{plan.value.capitalize()} Plan Subscription",
                     "amount": {
                         "currency_code": "USD",
-                        "value": str(price)
+                        "value": price
                     }
                 }],
                 "application_context": {
@@ -312,13 +323,9 @@ class SubscriptionService:
         return price_ids.get(plan)
     
     def _get_plan_price(self, plan):
-        """Get price for a plan"""
-        prices = {
-            SubscriptionPlan.FREE: 0,
-            SubscriptionPlan.PRO: 29.99,
-            SubscriptionPlan.ENTERPRISE: 99.99
-        }
-        return prices.get(plan, 0)
+        """Get PLAN_PRICE_CENTS for a plan as a decimal string, e.g. '29.99'"""
+        cents = PLAN_PRICE_CENTS.get(plan, 0)
+        return f"{cents // 100}.{cents % 100:02d}"
     
     def _handle_checkout_completed(self, session):
         """Handle completed checkout session"""
@@ -407,6 +414,27 @@ class SubscriptionService:
             current_app.logger.error(f"Error handling subscription deletion: {e}")
             raise
     
+    def _set_status(self, organization_id, status):
+        """Set subscription and organization status with two targeted UPDATEs; False if no subscription"""
+        now = datetime.now(timezone.utc)
+        result = db.session.execute(
+            db.update(Subscription)
+            .where(Subscription.organization_id == organization_id)
+            .values(status=status, updated_at=now)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return False
+        
+        # Update organization status too
+        db.session.execute(
+            db.update(Organization)
+            .where(Organization.id == organization_id)
+            .values(subscription_status=status, updated_at=now)
+        )
+        db.session.commit()
+        return True
+    
     def _handle_payment_succeeded(self, invoice):
         """Handle successful payment"""
         try:
@@ -421,19 +449,7 @@ class SubscriptionService:
                 current_app.logger.error("No organization_id in subscription metadata")
                 return
                 
-            subscription_obj = Subscription.query.filter_by(organization_id=organization_id).first()
-            
-            if subscription_obj:
-                subscription_obj.status = SubscriptionStatus.ACTIVE.value
-                subscription_obj.updated_at = datetime.now(timezone.utc)
-                
-                # Update organization status too
-                organization = Organization.query.get(organization_id)
-                if organization:
-                    organization.subscription_status = SubscriptionStatus.ACTIVE.value
-                    organization.updated_at = datetime.now(timezone.utc)
-                
-                db.session.commit()
+            if self._set_status(organization_id, SubscriptionStatus.ACTIVE):
                 current_app.logger.info(f"Payment succeeded for organization {organization_id}")
             else:
                 current_app.logger.error(f"Subscription not found for organization {organization_id}")
@@ -456,22 +472,10 @@ class SubscriptionService:
                 current_app.logger.error("No organization_id in subscription metadata")
                 return
                 
-            subscription_obj = Subscription.query.filter_by(organization_id=organization_id).first()
-            
-            if subscription_obj and hasattr(SubscriptionStatus, 'PAST_DUE'):
-                subscription_obj.status = SubscriptionStatus.PAST_DUE.value
-                subscription_obj.updated_at = datetime.now(timezone.utc)
-                
-                # Update organization status too
-                organization = Organization.query.get(organization_id)
-                if organization:
-                    organization.subscription_status = SubscriptionStatus.PAST_DUE.value
-                    organization.updated_at = datetime.now(timezone.utc)
-                
-                db.session.commit()
+            if self._set_status(organization_id, SubscriptionStatus.PAST_DUE):
                 current_app.logger.info(f"Payment failed for organization {organization_id}")
             else:
-                current_app.logger.warning(f"PAST_DUE status not available or subscription not found for org {organization_id}")
+                current_app.logger.warning(f"Subscription not found for org {organization_id}")
                 
         except Exception as e:
             current_app.logger.error(f"Error handling payment failure: {e}")
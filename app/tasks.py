@@ -0,0 +1,58 @@
+import smtplib
+from datetime import datetime
+from flask_mail import Message
+from app import celery, mail
+
+# One SMTP connection per worker process, kept open across messages so each email
+# costs a DATA exchange instead of a full connect + TLS + AUTH handshake.
+# Flask-Mail reopens it every MAIL_MAX_EMAILS messages.
+_connection = None
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        _connection = mail.connect().__enter__()
+    return _connection
+
+def _close_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+        _connection = None
+
+# Only connection-level failures are retried; permanent SMTP errors (refused recipients,
+# bad credentials) fail the task instead of being resent
+@celery.task(autoretry_for=(smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError),
+             retry_backoff=True, max_retries=3)
+def send_email_task(subject, recipients, text_body, html_body):
+    """Send an email over the worker's persistent SMTP connection"""
+    msg = Message(
+        subject=subject,
+        recipients=recipients,
+        body=text_body,
+        html=html_body
+    )
+    
+    try:
+        _get_connection().send(msg)
+    except (smtplib.SMTPServerDisconnected, ConnectionError):
+        # Server dropped the idle connection - reconnect once, then let Celery retry
+        _close_connection()
+        _get_connection().send(msg)
+
+@celery.task(ignore_result=True)
+def record_login_task(user_id, when):
+    """Stamp a user's last_login (ISO timestamp) off the request path"""
+    from app.models.user import User
+    User.set_last_login(user_id, datetime.fromisoformat(when))
+
+# acks_late: an event is only acknowledged once handled, so a worker crash mid-event
+# redelivers it instead of losing a billing update
+@celery.task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5, acks_late=True)
+def handle_stripe_event_task(event):
+    """Apply a verified Stripe webhook event (plain dict) outside the request cycle"""
+    from app.services.subscription_service import SubscriptionService
+    SubscriptionService().handle_webhook_event(event)
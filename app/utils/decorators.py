@@ -1,7 +1,10 @@
 
+from collections import namedtuple
 from functools import wraps
-from flask import redirect, url_for, flash, abort
+from flask import redirect, url_for, flash, abort, g
 from flask_login import current_user
+from app import db
+from app.models.user import User, UserRole
 
 def anonymous_required(f):
     """Decorator to redirect logged-in users away from auth pages"""
@@ -38,3 +41,33 @@ def organization_required(f):
             return redirect(url_for('dashboard.settings'))
         return f(*args, **kwargs)
     return decorated_function
+
+class Actor(namedtuple('Actor', ['id', 'organization_id', 'role', 'is_active'], defaults=[True])):
+    """The handful of User columns needed for permission checks"""
+    __slots__ = ()
+    
+    def is_admin(self):
+        return self.role == UserRole.ADMIN
+    
+    def has_role(self, role):
+        # Mirrors role_required: admins satisfy every role check
+        role = getattr(role, 'value', role)
+        return self.is_admin() or self.role.value == role
+
+def load_actor(user_id):
+    """Load only the ACL columns for a user, or None if the user doesn't exist"""
+    row = db.session.execute(
+        db.select(User.id, User.organization_id, User.role, User.is_active).where(User.id == user_id)
+    ).one_or_none()
+    return Actor(*row) if row else None
+
+def current_actor():
+    """Actor for the current JWT request, read from token claims when present"""
+    claims = g.jwt_claims
+    if 'org_id' not in claims:
+        # Tokens issued before authorization claims were added
+        actor = load_actor(claims['sub'])
+        return actor if actor and actor.is_active else None
+    if not claims.get('active', True):
+        return None
+    return Actor(claims['sub'], claims['org_id'], UserRole(claims['role']))
@@ -1,7 +1,10 @@
 from flask import current_app, render_template, url_for
 from flask_mail import Message
 from app import mail
-import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Dev fallback when no Celery broker is configured
+_executor = ThreadPoolExecutor(max_workers=4)
 
 def send_async_email(app, msg):
     """Send email asynchronously"""
@@ -21,11 +24,16 @@ def send_email(subject, recipients, text_body, html_body):
     if current_app.config.get('TESTING'):
         mail.send(msg)
     else:
-        thread = threading.Thread(
-            target=send_async_email,
-            args=(current_app._get_current_object(), msg)
-        )
-        thread.start()
+        if current_app.config.get('CELERY_BROKER_URL'):
+            from app.tasks import send_email_task
+            try:
+                send_email_task.delay(subject, recipients, text_body, html_body)
+                return
+            except Exception as e:
+                # Broker unreachable - don't fail the request, send from this process instead
+                current_app.logger.error(f"Error queueing email, sending locally: {e}")
+        
+        _executor.submit(send_async_email, current_app._get_current_object(), msg)
 
 def send_verification_email(user, token):
     """Send email verification"""
@@ -0,0 +1,64 @@
+import decimal
+import os
+import orjson
+from functools import lru_cache
+from types import MappingProxyType
+from urllib.parse import urlsplit
+from flask import Response, current_app, url_for
+from flask.json.provider import JSONProvider
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def _default(obj):
+    """Fallback for types orjson doesn't serialize natively"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, MappingProxyType):
+        # Read-only module-level tables, e.g. Subscription.plan_features
+        return dict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, so jsonify() and request.get_json() use it"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return current_app.response_class(
+            orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS),
+            mimetype='application/json'
+        )
+
+@lru_cache(maxsize=16)
+def checkout_urls(host_url, success_endpoint, cancel_endpoint):
+    """Get (success_url, cancel_url) for a checkout session, built once per host"""
+    # Keyed on host_url: external URLs embed the request's scheme and host
+    return (
+        url_for(success_endpoint, _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
+        url_for(cancel_endpoint, _external=True)
+    )
+
+# Hosts a ?next= redirect may point at besides same-site relative URLs (comma separated)
+_ALLOWED_HOSTS = frozenset(host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host)
+
+@lru_cache(maxsize=1024)
+def is_safe_redirect(target):
+    """Check a post-login redirect target is relative or on an allowed host"""
+    # Browsers treat backslashes like slashes, so a leading '/\' is protocol-relative too
+    parsed = urlsplit(target.replace('\\', '/'))
+    if parsed.scheme not in ('', 'http', 'https'):
+        return False
+    return not parsed.netloc or parsed.netloc in _ALLOWED_HOSTS
+
+def json_response(payload, status=200):
+    """Serialize payload with orjson (C-accelerated) into a JSON response"""
+    return Response(orjson.dumps(payload, default=_default, option=ORJSON_OPTIONS),
+                    status=status, mimetype='application/json')
@@ -0,0 +1,52 @@
+import threading
+from functools import wraps
+from flask import g
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from cachetools import TTLCache
+
+# User.to_dict() snapshots keyed by access-token jti: (user_id, generation, snapshot).
+# Per worker process: invalidate_user() only reaches this process's cache, so other
+# workers can serve a snapshot up to the 60s TTL old
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+# Per-user generation bumped by invalidate_user(). A plain dict (one int per invalidated
+# user) so an eviction can never reset a generation and revive an older snapshot
+_user_generations = {}
+_user_lock = threading.Lock()
+
+def get_cached_user(user_id, jti):
+    """Get a User.to_dict() snapshot for the token's user, loading it on cache miss"""
+    from app.models.user import User
+
+    with _user_lock:
+        entry = _user_cache.get(jti)
+        generation = _user_generations.get(user_id, 0)
+
+    if entry is not None and entry[0] == user_id and entry[1] == generation:
+        return entry[2]
+
+    user = User.query.get(user_id)
+    if not user:
+        return None
+    snapshot = user.to_dict()
+    with _user_lock:
+        _user_cache[jti] = (user_id, generation, snapshot)
+
+    return snapshot
+
+def invalidate_user(user_id):
+    """Drop this process's cached snapshots of a user after a write"""
+    with _user_lock:
+        _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+
+def jwt_required_with_claims(f):
+    """jwt_required() that also exposes the verified claims as g.jwt_claims / g.jwt_identity"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Full flask-jwt-extended verification: token locations, blocklist, error handlers
+        verify_jwt_in_request()
+        claims = get_jwt()
+
+        g.jwt_claims = claims
+        g.jwt_identity = claims['sub']
+        return f(*args, **kwargs)
+    return decorated_function
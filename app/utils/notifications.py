@@ -1,6 +1,7 @@
 
 from flask import current_app
 from app import db
+from app.models._time import utcnow
 from app.models.user import User
 from app.utils.email import send_email
 from datetime import datetime, timezone
@@ -35,7 +36,7 @@ class Notification(db.Model):
     metadata = db.Column(db.JSON)
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utcnow)
     read_at = db.Column(db.DateTime)
     
     def mark_as_read(self):
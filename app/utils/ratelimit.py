@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from limits.storage import RedisStorage
+
+class _LocalCounter:
+    __slots__ = ('synced', 'pending', 'window_start', 'last_flush', 'expiry')
+
+    def __init__(self, now, expiry):
+        self.expiry = expiry
+        self.synced = 0        # last count Redis reported for this key
+        self.pending = 0       # local hits not yet pushed to Redis
+        self.window_start = now
+        self.last_flush = 0.0  # forces a sync on the first hit of a window
+
+class BatchedRedisStorage(RedisStorage):
+    """Redis limiter storage that batches increments per worker.
+
+    Hits are counted in-process and pushed to Redis every ``batch_size``
+    increments or ``flush_interval`` seconds, whichever comes first. The
+    Redis round-trip also brings back the global count, so each worker
+    re-syncs with the others on every flush. A worker can under-count by at
+    most ``batch_size`` hits, so across the fleet limits may be exceeded by
+    up to ``n_workers * batch_size``.
+
+    Registered under the ``batched-redis://`` scheme.
+    """
+
+    STORAGE_SCHEME = ['batched-redis']
+
+    def __init__(self, uri, batch_size=50, flush_interval=0.5, max_keys=10000, **options):
+        super().__init__(uri.replace('batched-redis://', 'redis://', 1), **options)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or now - counter.window_start >= expiry:
+                counter = self._counters[key] = _LocalCounter(now, expiry)
+            self._counters.move_to_end(key)
+
+            counter.pending += amount
+            to_flush = 0
+            if counter.pending >= self.batch_size or now - counter.last_flush >= self.flush_interval:
+                to_flush, counter.pending = counter.pending, 0
+                counter.last_flush = now
+
+            evicted = []
+            while len(self._counters) > self.max_keys:
+                evicted.append(self._counters.popitem(last=False))
+
+        # Don't lose hits for keys pushed out of the local cache
+        for evicted_key, evicted_counter in evicted:
+            if evicted_counter.pending:
+                super().incr(evicted_key, evicted_counter.expiry, elastic_expiry, evicted_counter.pending)
+
+        if to_flush:
+            counter.synced = super().incr(key, expiry, elastic_expiry, to_flush)
+
+        return counter.synced + counter.pending
+
+    def get(self, key):
+        with self._lock:
+            counter = self._counters.get(key)
+            pending = counter.pending if counter else 0
+        return super().get(key) + pending
+
+    def clear(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+        super().clear(key)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+        return super().reset()
@@ -0,0 +1,40 @@
+from sqlalchemy import func, case
+from app import db, cache
+from app.models.user import User, UserRole
+from app.models.organization import Organization
+
+EMPTY_USER_STATS = {'total_users': 0, 'active_users': 0, 'verified_users': 0, 'admin_users': 0}
+
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+@cache.memoize(timeout=60)
+def get_user_stats(org_id=None):
+    """Get user counts in one aggregate query, for an organization or system-wide (None)"""
+    query = db.session.query(
+        func.count(User.id),
+        _count_where(User.is_active.is_(True)),
+        _count_where(User.is_verified.is_(True)),
+        _count_where(User.role == UserRole.ADMIN)
+    )
+    if org_id is not None:
+        query = query.filter(User.organization_id == org_id)
+    
+    total, active, verified, admins = query.one()
+    return {
+        'total_users': total,
+        'active_users': active,
+        'verified_users': verified,
+        'admin_users': admins
+    }
+
+@cache.memoize(timeout=60)
+def get_organization_count():
+    """Get the system-wide organization count"""
+    return db.session.query(func.count(Organization.id)).scalar()
+
+def invalidate_user_stats(org_id):
+    """Drop cached stats for an organization and the system-wide totals"""
+    cache.delete_memoized(get_user_stats, org_id)
+    cache.delete_memoized(get_user_stats, None)
+    cache.delete_memoized(get_organization_count)
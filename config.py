@@ -19,6 +19,8 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    # Workers reuse one SMTP connection and recycle it after this many messages
+    MAIL_MAX_EMAILS = 100
     
     # File uploads
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -34,11 +36,31 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
-    # Rate limiting
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL') or 'memory://'
+    # Rate limiting - shared across workers through Redis. fixed-window counters are
+    # batched per worker (app/utils/ratelimit.py); moving-window uses Redis' atomic
+    # Lua sorted-set script directly, exact but one round-trip per check
+    REDIS_URL = os.environ.get('REDIS_URL')
+    RATELIMIT_STORAGE_URI = REDIS_URL.replace('redis://', 'batched-redis://', 1) if REDIS_URL else 'memory://'
+    RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', 'fixed-window')
+    # Bounded pool with short socket timeouts, so a slow Redis can't hold a request (or
+    # open unbounded connections) on the limiter check; health checks drop dead idle sockets
+    RATELIMIT_STORAGE_OPTIONS = {
+        'max_connections': int(os.environ.get('RATELIMIT_REDIS_MAX_CONNECTIONS', 64)),
+        'socket_timeout': 1,
+        'socket_connect_timeout': 1,
+        'health_check_interval': 30
+    } if REDIS_URL else {}
     
-    # Cache
-    CACHE_TYPE = 'simple'
+    # Background jobs - opt-in, since tasks need a running worker (docker-compose starts
+    # one). Without a broker, emails go through a local thread pool and the rest runs inline
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+    # Optional dedicated queue for Stripe webhook events, so a mail backlog can't delay
+    # billing updates; workers must consume it (celery worker -Q celery,<queue>)
+    STRIPE_WEBHOOK_QUEUE = os.environ.get('STRIPE_WEBHOOK_QUEUE')
+    
+    # Cache - shared across workers via Redis when available
+    CACHE_TYPE = 'RedisCache' if REDIS_URL else 'SimpleCache'
+    CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = 300
     
     # Pagination
@@ -47,6 +69,7 @@ class Config:
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_WEBHOOK_MAX_BYTES = 512 * 1024  # larger webhook bodies are rejected with 413
     STRIPE_PRO_PRICE_ID = os.environ.get('STRIPE_PRO_PRICE_ID')
     STRIPE_ENTERPRISE_PRICE_ID = os.environ.get('STRIPE_ENTERPRISE_PRICE_ID')
     
@@ -59,6 +82,9 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    # Opt-in locally (RAISELOAD_STRICT=1): raise on unintended lazy loads instead of
+    # silently issuing extra queries. Always on under TestingConfig
+    RAISELOAD_STRICT = os.environ.get('RAISELOAD_STRICT', '').lower() in ['true', 'on', '1']
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'dev.db')
 
@@ -66,11 +92,31 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    RAISELOAD_STRICT = True
+    # Minimal KDF cost so password hashing doesn't dominate test runtime
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     
+    # Per-process pool: size it so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under the
+    # server's max_connections. pre_ping + recycle replace connections the server or a
+    # proxy has dropped while idle, instead of failing the next request on them
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 40)),
+            'pool_timeout': 10,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True
+        }
+    
+    # psycopg 3 only: prepare statements server-side from the first execution
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql+psycopg://'):
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'prepare_threshold': 1}
+    
     # Production security settings
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
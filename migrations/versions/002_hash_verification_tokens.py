@@ -0,0 +1,56 @@
+# 002_hash_verification_tokens.py - Store only SHA-256 digests of email verification tokens
+from app import create_app, db
+from app.models.user import hash_token
+
+def upgrade():
+    """Add the hashed token column, backfill it and drop the plaintext column"""
+    app = create_app()
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('users')]
+            
+            if 'email_verification_token_hash' not in columns:
+                print("Adding users.email_verification_token_hash...")
+                db.session.execute(db.text(
+                    'ALTER TABLE users ADD COLUMN email_verification_token_hash VARCHAR(64)'
+                ))
+            
+            if 'email_verification_token' in columns:
+                # Outstanding tokens keep working: their links now match on the digest
+                rows = db.session.execute(db.text(
+                    'SELECT id, email_verification_token FROM users '
+                    'WHERE email_verification_token IS NOT NULL'
+                )).all()
+                print(f"Backfilling {len(rows)} pending verification tokens...")
+                
+                if rows:
+                    db.session.execute(
+                        db.text('UPDATE users SET email_verification_token_hash = :token_hash WHERE id = :id'),
+                        [{'id': row.id, 'token_hash': hash_token(row.email_verification_token)} for row in rows]
+                    )
+                db.session.execute(db.text('ALTER TABLE users DROP COLUMN email_verification_token'))
+            
+            db.session.commit()
+            
+            # Partial unique index: only pending tokens are indexed. On Postgres it is built
+            # CONCURRENTLY (outside a transaction) so users stays writable meanwhile
+            index_sql = (
+                'CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS ix_users_email_verification_token_hash '
+                'ON users (email_verification_token_hash) WHERE email_verification_token_hash IS NOT NULL'
+            )
+            if db.engine.dialect.name == 'postgresql':
+                with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    conn.execute(db.text(index_sql.format(concurrently='CONCURRENTLY ')))
+            else:
+                db.session.execute(db.text(index_sql.format(concurrently='')))
+                db.session.commit()
+            print("Verification tokens migrated.")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error migrating verification tokens: {e}")
+            raise
+
+if __name__ == '__main__':
+    upgrade()
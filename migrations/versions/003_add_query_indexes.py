@@ -0,0 +1,103 @@
+# 003_add_query_indexes.py - Create the list/stats/analytics indexes declared on the models
+from app import create_app, db
+from app.models.user import SEARCH_COLUMNS
+
+# name -> (table, index definition); new databases get these from db.create_all()
+INDEXES = {
+    'ix_users_org_created_at': ('users', '(organization_id, created_at DESC)'),
+    'ix_users_org_stats': ('users', '(organization_id, is_active, is_verified, role)'),
+    'ix_users_created_at': ('users', '(created_at)'),
+    'ix_organizations_created_at': ('organizations', '(created_at)'),
+    'ix_audit_logs_org_created_at': ('audit_logs', '(organization_id, created_at DESC)'),
+    'ix_audit_logs_user_created_at': ('audit_logs', '(user_id, created_at DESC)'),
+    'ix_audit_logs_resource': ('audit_logs', '(resource_type, resource_id)'),
+    'ix_audit_logs_created_at': ('audit_logs', '(created_at)'),
+}
+
+# Case-insensitive email lookups (User.find_by_email); built after the lowercase backfill
+UNIQUE_INDEXES = {
+    'ux_users_email_lower': ('users', '((lower(email)))'),
+}
+
+# Postgres-only: the pattern-ops and trigram indexes behind User.search_clause, the
+# partial verified-user index and the covering ACL index
+POSTGRES_INDEXES = {
+    **{f'ix_users_{col}_pattern': ('users', f'({col} text_pattern_ops)') for col in SEARCH_COLUMNS},
+    **{f'ix_users_{col}_trgm': ('users', f'USING gin ({col} gin_trgm_ops)') for col in SEARCH_COLUMNS},
+    'ix_users_verified': ('users', '(is_verified) WHERE is_verified'),
+    'ix_users_acl': ('users', '(id) INCLUDE (organization_id, role)'),
+}
+
+def lowercase_emails():
+    """Store existing emails lowercase, refusing if two accounts differ only by case"""
+    duplicates = db.session.execute(db.text(
+        'SELECT lower(email) AS email, COUNT(*) AS accounts FROM users '
+        'GROUP BY lower(email) HAVING COUNT(*) > 1'
+    )).all()
+    if duplicates:
+        # Merging accounts can't be done safely here - resolve them by hand and re-run
+        for row in duplicates:
+            print(f"  {row.email}: {row.accounts} accounts")
+        raise RuntimeError(f"{len(duplicates)} emails are shared by accounts differing only by case")
+    
+    result = db.session.execute(db.text('UPDATE users SET email = lower(email) WHERE email <> lower(email)'))
+    db.session.commit()
+    print(f"Lowercased {result.rowcount} emails.")
+
+def upgrade():
+    """Create any of the indexes above missing from an existing database"""
+    app = create_app()
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+            existing = {
+                index['name']
+                for table in {table for table, _ in [*INDEXES.values(), *UNIQUE_INDEXES.values(),
+                                                     *POSTGRES_INDEXES.values()]}
+                for index in inspector.get_indexes(table)
+            }
+            if db.engine.dialect.name == 'sqlite':
+                # SQLite reflection skips expression indexes such as ux_users_email_lower
+                existing.update(db.session.execute(db.text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )).scalars())
+            
+            if 'ux_users_email_lower' not in existing:
+                lowercase_emails()
+            
+            pending = [(name, table, definition, '') for name, (table, definition) in INDEXES.items()]
+            pending += [(name, table, definition, 'UNIQUE ') for name, (table, definition) in UNIQUE_INDEXES.items()]
+            if db.engine.dialect.name == 'postgresql':
+                # gin_trgm_ops needs the extension before the trigram indexes are built
+                with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    conn.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+                pending += [(name, table, definition, '') for name, (table, definition) in POSTGRES_INDEXES.items()]
+            else:
+                # Earlier create_all() runs built these here too, as redundant plain B-trees
+                for name in sorted(POSTGRES_INDEXES.keys() & existing):
+                    table = POSTGRES_INDEXES[name][0]
+                    print(f"Dropping index {name}...")
+                    on_table = f' ON {table}' if db.engine.dialect.name == 'mysql' else ''
+                    db.session.execute(db.text(f'DROP INDEX {name}{on_table}'))
+                db.session.commit()
+            for name, table, definition, unique in pending:
+                if name in existing:
+                    continue
+                print(f"Creating index {name}...")
+                
+                if db.engine.dialect.name == 'postgresql':
+                    # CONCURRENTLY (outside a transaction) keeps the table writable meanwhile
+                    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        conn.execute(db.text(f'CREATE {unique}INDEX CONCURRENTLY {name} ON {table} {definition}'))
+                else:
+                    db.session.execute(db.text(f'CREATE {unique}INDEX {name} ON {table} {definition}'))
+                    db.session.commit()
+            print("Query indexes created.")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating query indexes: {e}")
+            raise
+
+if __name__ == '__main__':
+    upgrade()
@@ -1,4 +1,4 @@
-from app import create_app, db
+from app import create_app, db, celery
 from app.models.user import User, UserRole
 from app.models.organization import Organization, SubscriptionStatus
 import os
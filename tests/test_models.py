@@ -0,0 +1,103 @@
+import unittest
+from flask import Response
+from app import create_app, db
+from app.models.user import User
+from app.models.organization import Organization
+from app.models.subscription import Subscription, SubscriptionPlan, SubscriptionStatus
+from app.models.audit import AuditLog, AuditAction, log_audit, flush_audit_buffer
+
+class ModelTestCase(unittest.TestCase):
+    """Test model lookups and write helpers"""
+    
+    def setUp(self):
+        self.app = create_app('config.TestingConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        
+        # Create test organization
+        self.test_org = Organization(name='Test Org', slug='test-org')
+        db.session.add(self.test_org)
+        db.session.commit()
+        
+        # Create test user
+        self.test_user = User(
+            username='testuser',
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            organization_id=self.test_org.id
+        )
+        self.test_user.set_password('testpass123')
+        db.session.add(self.test_user)
+        db.session.commit()
+    
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_search_clause(self):
+        """Test prefix searches use LIKE and leading-% searches use ILIKE"""
+        clause, q = User.search_clause('tes')
+        self.assertEqual(q, 'tes%')
+        self.assertIn(self.test_user, User.query.filter(clause).params(q=q).all())
+        
+        clause, q = User.search_clause('%EXAMPLE')
+        self.assertEqual(q, '%EXAMPLE%')
+        self.assertIn(self.test_user, User.query.filter(clause).params(q=q).all())
+    
+    def test_email_lookup_ignores_case(self):
+        """Test emails are stored lowercase and found case-insensitively"""
+        user = User(username='mixedcase', email=' Mixed@Example.com', first_name='Mixed', last_name='Case')
+        self.assertEqual(user.email, 'mixed@example.com')
+        self.assertEqual(User.find_by_email('  TEST@example.COM ').id, self.test_user.id)
+        self.assertIsNone(User.find_by_email('other@example.com'))
+    
+    def test_verification_token_is_consumed_once(self):
+        """Test a verification token verifies its owner and can't be reused"""
+        token = self.test_user.generate_verification_token()
+        db.session.commit()
+        
+        row = User.consume_verification_token(token)
+        self.assertEqual(tuple(row), (self.test_user.id, self.test_org.id))
+        user = db.session.get(User, self.test_user.id)
+        self.assertTrue(user.is_verified)
+        self.assertIsNone(user.email_verification_token_hash)
+        
+        self.assertIsNone(User.consume_verification_token(token))
+        self.assertIsNone(User.consume_verification_token('not-a-token'))
+    
+    def test_subscription_upsert(self):
+        """Test upsert inserts once, then updates the organization's row"""
+        Subscription.upsert([{'organization_id': self.test_org.id, 'plan': SubscriptionPlan.PRO,
+                              'status': SubscriptionStatus.ACTIVE}])
+        Subscription.upsert([{'organization_id': self.test_org.id, 'plan': SubscriptionPlan.PRO,
+                              'status': SubscriptionStatus.PAST_DUE}])
+        db.session.commit()
+        
+        subscriptions = Subscription.query.filter_by(organization_id=self.test_org.id).all()
+        self.assertEqual(len(subscriptions), 1)
+        self.assertEqual(subscriptions[0].status, SubscriptionStatus.PAST_DUE)
+    
+    def test_registration_conflicts(self):
+        """Test email and username availability in one lookup"""
+        self.assertEqual(User.registration_conflicts('TEST@example.com', 'newuser'), {'email'})
+        self.assertEqual(User.registration_conflicts('new@example.com', 'testuser'), {'username'})
+        self.assertEqual(User.registration_conflicts('new@example.com', 'newuser'), set())
+    
+    def test_audit_entries_flush_together(self):
+        """Test audit entries logged in a request are written together by the after_request hook"""
+        with self.app.test_request_context('/'):
+            log_audit(self.test_user.id, AuditAction.UPDATE, 'user', self.test_user.id)
+            log_audit(self.test_user.id, AuditAction.LOGIN, 'user', self.test_user.id)
+            self.assertEqual(AuditLog.query.count(), 0)
+            
+            flush_audit_buffer(Response())
+        
+        entries = AuditLog.query.all()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual({entry.organization_id for entry in entries}, {self.test_org.id})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+import stripe
+from app import create_app, db, cache
+
+class StripeWebhookTestCase(unittest.TestCase):
+    """Test Stripe webhook deduplication and retries"""
+    
+    def setUp(self):
+        self.app = create_app('config.TestingConfig')
+        self.app.config['CELERY_BROKER_URL'] = None  # handle events inline
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+        cache.clear()
+        
+        # Signature checking is Stripe's; these tests cover what happens after it
+        self.event = {'id': 'evt_test', 'type': 'invoice.payment_succeeded', 'data': {'object': {}}}
+        patcher = mock.patch('stripe.Webhook.construct_event', return_value=self.event)
+        self.construct_event = patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        patcher = mock.patch('app.main.routes.get_subscription_service')
+        self.service = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def post_event(self):
+        return self.client.post('/webhook/stripe', data=b'{}',
+                                headers={'Stripe-Signature': 't=1,v1=test'})
+    
+    def test_duplicate_delivery_is_handled_once(self):
+        """Test a redelivered event is acknowledged without re-running the handler"""
+        response = self.post_event()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'success')
+        
+        response = self.post_event()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'duplicate')
+        self.assertEqual(self.service.handle_webhook_event.call_count, 1)
+    
+    def test_invalid_signature(self):
+        """Test an unverified payload is rejected and never claimed"""
+        self.construct_event.side_effect = stripe.error.SignatureVerificationError('bad signature', 't=1,v1=test')
+        
+        response = self.post_event()
+        self.assertEqual(response.status_code, 400)
+        self.service.handle_webhook_event.assert_not_called()
+        
+        self.construct_event.side_effect = None
+        response = self.post_event()
+        self.assertEqual(response.get_json()['status'], 'success')
+    
+    def test_failed_handler_lets_retry_through(self):
+        """Test Stripe's retry is processed after a handler error"""
+        self.service.handle_webhook_event.side_effect = [ValueError('bad metadata'), None]
+        
+        response = self.post_event()
+        self.assertEqual(response.status_code, 500)
+        
+        response = self.post_event()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'success')
+        self.assertEqual(self.service.handle_webhook_event.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()